@@ -1,153 +1,446 @@
-from flask import Flask, render_template, request, jsonify
+import time
+APP_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, abort, g, render_template, request, jsonify
 import json
+import math
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 
-# Import the new function from scraper.py
-from scraper import run_scraper_and_get_data
+from catalogue import DEFAULT_PAGE_SIZE, FACET_FIELDS, LADDER_PAGE_SIZE, MAX_PAGE_SIZE, RANGE_FIELDS, SORT_FIELDS
+from fx import FxTable
+import metrics
+from price_history import DROP_WINDOW_HOURS, MAX_DROPS
+from regions import DEFAULT_REGION, REGIONS
+from scoring import WEIGHTS_CURRENCY, weight_vector
+from response_cache import ResponseCache, make_body
+from shards import SCRAPE_INTERVAL_HOURS, ShardManager
 
 app = Flask(__name__)
 
-PRODUCTS_FILE = 'apple_products.json'
-LAST_SCRAPED_FILE = 'last_scraped.txt'
-SCRAPE_INTERVAL_HOURS = 24 # Scrape data if older than 24 hours
-
-def get_last_scraped_time():
-    if os.path.exists(LAST_SCRAPED_FILE):
-        with open(LAST_SCRAPED_FILE, 'r') as f:
-            return datetime.fromisoformat(f.read().strip())
-    return None
-
-def set_last_scraped_time():
-    with open(LAST_SCRAPED_FILE, 'w') as f:
-        f.write(datetime.now().isoformat())
-
-def load_products():
-    last_scraped = get_last_scraped_time()
-    needs_scrape = True
-
-    if last_scraped:
-        if datetime.now() - last_scraped < timedelta(hours=SCRAPE_INTERVAL_HOURS):
-            needs_scrape = False
-            print("Scraped data is recent. Loading from file.")
-        else:
-            print("Scraped data is older than 24 hours. Will re-scrape.")
-    else:
-        print("No record of last scrape. Will scrape now.")
-
-    if needs_scrape or not os.path.exists(PRODUCTS_FILE):
-        print("Running scraper to fetch fresh product data...")
-        # Call the scraper function from scraper.py
-        products_data = run_scraper_and_get_data() # This will also save to apple_products.json
-        if products_data: # Check if scraper returned any data
-            set_last_scraped_time()
-            print(f"Scraping complete. {len(products_data)} products loaded.")
-            return products_data # Return the freshly scraped data
-        elif os.path.exists(PRODUCTS_FILE): # If scraping failed but old file exists
-             print("Scraping failed, but an old products file exists. Loading old data.")
-             with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else: # Scraping failed and no old file
-            print("Scraping failed and no existing products file. Returning empty list.")
-            return []
-
-
-    # If not needs_scrape and file exists
-    if os.path.exists(PRODUCTS_FILE):
-        try:
-            with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
-                products = json.load(f)
-                print(f"Loaded {len(products)} products from {PRODUCTS_FILE}")
-                return products
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON from {PRODUCTS_FILE}. Triggering re-scrape.")
-            # Fallthrough to re-scrape logic essentially by returning result of run_scraper_and_get_data
-            products_data = run_scraper_and_get_data()
-            if products_data:
-                set_last_scraped_time()
-            return products_data if products_data else []
-    else: # Should be caught by needs_scrape logic, but as a fallback
-        print(f"{PRODUCTS_FILE} not found. Triggering scrape.")
-        products_data = run_scraper_and_get_data()
-        if products_data:
-            set_last_scraped_time()
-        return products_data if products_data else []
-
-
-PRODUCTS = load_products()
-if not PRODUCTS:
+REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds', 'Request latency by route', ('route', 'method'))
+REQUESTS = metrics.counter('http_requests_total', 'Requests by route and status code', ('route', 'method', 'status'))
+STARTUP_GAUGE = metrics.gauge('app_startup_seconds', 'Time from import to ready to serve')
+# The sampling profiler can be switched on over HTTP only when ENABLE_PROFILER=1 is set
+PROFILER = metrics.SamplingProfiler() if os.environ.get('ENABLE_PROFILER') == '1' else None
+
+RESPONSE_CACHE = ResponseCache()
+FX = FxTable()
+# Region catalogues load on first use and are dropped when idle; entries in RESPONSE_CACHE are keyed by
+# catalogue version, so clearing on every reload only frees memory, old entries can never match
+SHARDS = ShardManager(SCRAPE_INTERVAL_HOURS, on_reload=lambda shard: RESPONSE_CACHE.clear(),
+                      start_refreshers=os.environ.get('DISABLE_BACKGROUND_REFRESH') != '1')
+DEFAULT_SHARD = SHARDS.get(DEFAULT_REGION)
+if not DEFAULT_SHARD.catalogue.products:
     print("Warning: No products loaded. The application might not function as expected.")
 else:
-    print(f"Total products loaded into app: {len(PRODUCTS)}")
+    print(f"Total products loaded into app: {len(DEFAULT_SHARD.catalogue)}")
+STARTUP_SECONDS = time.perf_counter() - APP_IMPORT_STARTED
+STARTUP_GAUGE.set(STARTUP_SECONDS)
+print(f"Ready to serve in {STARTUP_SECONDS * 1000:.0f} ms")
 
 
-def get_value_score(product):
-    score = 0
-    price = product.get('price_inr', float('inf'))
-    if price == 0 or price == float('inf'): return 0 # Avoid division by zero or infinite scores
+class BadQuery(ValueError):
+    pass
 
-    # Weights - these can be tuned
-    ram_weight = 25000  # Value per GB of RAM
-    storage_weight = 50000 # Value per TB of SSD Storage
-    cpu_core_weight = 7000 # Value per CPU core
-    gpu_core_weight = 10000 # Value per GPU core
-    # screen_size_weight = 1000 # Value per inch of screen (less critical for pure value)
 
-    score += product.get('ram_gb', 0) * ram_weight
-    score += product.get('storage_tb', 0) * storage_weight
-    score += product.get('cpu_cores', 0) * cpu_core_weight
-    score += product.get('gpu_cores', 0) * gpu_core_weight
-    # score += product.get('screen_size_inch', 0) * screen_size_weight
+class NotRecorded(LookupError):
+    pass
 
-    # Normalize by price: higher score for cheaper products with good specs
-    # Adding 1 to price to avoid division by zero if price is somehow 0
-    return score / (price + 1) if price > 0 else score
 
+def request_data():
+    # POST takes a JSON body. GET takes the same fields as query parameters (weights as a JSON
+    # object, regions comma-separated), so browsers and proxies can revalidate it with If-None-Match.
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise BadQuery("Request body must be a JSON object")
+        return data
+    data = request.args.to_dict()
+    if 'weights' in data:
+        try:
+            data['weights'] = json.loads(data['weights'])
+        except ValueError:
+            raise BadQuery("Invalid weights format")
+    if 'regions' in data:
+        data['regions'] = [code for code in data['regions'].split(',') if code]
+    return data
 
-@app.route('/')
-def index():
-    # Sort products by price for the price ladder display
-    sorted_products = sorted(PRODUCTS, key=lambda p: p.get('price_inr', float('inf')))
-    return render_template('index.html', products=sorted_products)
+def shard_for(code, peek=False):
+    # peek: read-only use; a region that isn't loaded is read from disk without loading or scraping it
+    if code is not None and not isinstance(code, str):
+        raise BadQuery("Invalid region format")
+    try:
+        return SHARDS.peek(code) if peek else SHARDS.get(code)
+    except KeyError:
+        raise BadQuery(f"Unknown region '{code}'. Known regions: {', '.join(REGIONS)}")
 
-@app.route('/find_products', methods=['POST'])
-def find_products_api():
-    data = request.get_json()
+def parse_query(data):
+    # Returns (budget, facets, rank_by, weights); raises BadQuery with the message for a 400
     budget = data.get('budget')
 
     if budget is None:
-        return jsonify({"error": "Budget not provided"}), 400
+        raise BadQuery("Budget not provided")
     try:
         budget = float(budget)
-    except ValueError:
-        return jsonify({"error": "Invalid budget format"}), 400
+    except (TypeError, ValueError):
+        raise BadQuery("Invalid budget format")
+
+    # Optional filters, e.g. {"budget": 150000, "category": "MacBook Air", "chip": "Apple M4 chip"}
+    facets = {field: data.get(field) for field in FACET_FIELDS if data.get(field) is not None}
+    if any(not isinstance(value, str) for value in facets.values()):
+        raise BadQuery("Invalid filter format")
+
+    rank_by = data.get('rank_by', 'price')
+    weights = None
+    if rank_by == 'value':
+        # Sort by value score (descending) then by price (ascending) as a tie-breaker,
+        # optionally with per-request weights, e.g. {"weights": {"ram_gb": 40000, "gpu_cores": 0}}
+        weights = data.get('weights')
+        if weights is not None and not isinstance(weights, dict):
+            raise BadQuery("Invalid weights format")
+        try:
+            weights = weight_vector(weights)
+        except ValueError as e:
+            raise BadQuery(str(e))
+    elif rank_by != 'price':
+        raise BadQuery("rank_by must be 'price' or 'value'")
+    return budget, facets, rank_by, weights
+
+def parse_search(data):
+    # Returns (ranges, facets, sort, descending, offset, limit, weights) for /search; raises BadQuery.
+    # Ranges are min_<field>/max_<field> for the spec fields and price, e.g. {"min_ram_gb": 16,
+    # "min_storage_tb": 0.5, "max_price": 150000}; category and chip take one value or several
+    # (a list, or comma-separated), any of which may match.
+    ranges = {}
+    for field in RANGE_FIELDS:
+        bounds = []
+        for name in (f'min_{field}', f'max_{field}'):
+            value = data.get(name)
+            if value is not None:
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    raise BadQuery(f"Invalid {name} format")
+                if not math.isfinite(value):
+                    raise BadQuery(f"Invalid {name} format")
+            bounds.append(value)
+        if bounds != [None, None]:
+            ranges[field] = tuple(bounds)
+
+    facets = {}
+    for field in FACET_FIELDS:
+        values = data.get(field)
+        if values is None:
+            continue
+        if isinstance(values, str):
+            values = [value for value in values.split(',') if value.strip()]
+        if not isinstance(values, list) or not values or not all(isinstance(value, str) for value in values):
+            raise BadQuery("Invalid filter format")
+        facets[field] = values
+
+    # Price sorts cheapest first by default and specs biggest first; order=asc/desc overrides that.
+    # Value always ranks best first, with optional weights as for /find_products.
+    sort, order = data.get('sort', 'price'), data.get('order')
+    if sort not in SORT_FIELDS:
+        raise BadQuery(f"sort must be one of {', '.join(SORT_FIELDS)}")
+    if order not in (None, 'asc', 'desc'):
+        raise BadQuery("order must be 'asc' or 'desc'")
+    descending = order == 'desc' if order else sort != 'price'
+    weights = None
+    if sort == 'value':
+        weights = data.get('weights')
+        if weights is not None and not isinstance(weights, dict):
+            raise BadQuery("Invalid weights format")
+        try:
+            weights = weight_vector(weights)
+        except ValueError as e:
+            raise BadQuery(str(e))
+
+    try:
+        offset = int(data.get('offset', 0))
+        limit = int(data.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise BadQuery("offset and limit must be integers")
+    if offset < 0 or not 0 < limit <= MAX_PAGE_SIZE:
+        raise BadQuery(f"offset must be 0 or more and limit between 1 and {MAX_PAGE_SIZE}")
+    return ranges, facets, sort, descending, offset, limit, weights
+
+def parse_time(data, name):
+    # ISO 8601 date/time (server local time unless it carries an offset) -> Unix seconds, or None
+    value = data.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise BadQuery(f"{name} must be an ISO 8601 date or time, e.g. 2025-05-01T09:00")
+
+def history_product(shard, data):
+    # The product a history query is about: {"part_number": "MX2E3HN/A"} or the "id" that history
+    # and drop responses carry. Raises NotRecorded (404) when the history has never seen it.
+    part_number, product_id = data.get('part_number'), data.get('id')
+    if part_number is None and product_id is None:
+        raise BadQuery("part_number or id is required")
+    if part_number is not None and not isinstance(part_number, str):
+        raise BadQuery("Invalid part_number format")
+    if product_id is not None:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise BadQuery("Invalid id format")
+        if not -2 ** 63 <= product_id < 2 ** 63:  # SQLite INTEGER range
+            raise BadQuery("id out of range")
+    product = shard.history.find_product(product_id, part_number)
+    if product is None:
+        raise NotRecorded("No price history for this product")
+    return product
+
+def ladder_page(catalogue, region, start, limit=LADDER_PAGE_SIZE):
+    # Takes the catalogue the caller keyed its cache entry on, not shard.catalogue, which a reload
+    # may have swapped in the meantime
+    stop = min(start + limit, len(catalogue))
+    return {"region": region.code, "catalogue_version": catalogue.version, "total": len(catalogue), "start": start,
+            "products": [dict(p) for p in catalogue.ladder[start:stop]], "next_cursor": catalogue.ladder_cursor(stop)}
+
+def regional_weights(weights, region):
+    # Weights are in WEIGHTS_CURRENCY (value per GB, per core, ...); in the region's currency they give
+    # every region's scores the same scale, value per unit of WEIGHTS_CURRENCY
+    if weights is None or region.currency == WEIGHTS_CURRENCY:
+        return weights
+    return weights * FX.convert(1.0, WEIGHTS_CURRENCY, region.currency)
+
+def find(catalogue, budget, facets, rank_by, weights, limit=5):
+    if rank_by == 'value':
+        return catalogue.find_best_value(budget, limit=limit, weights=weights, **facets)
+    # Most expensive products within budget
+    return catalogue.find_under_budget(budget, limit=limit, **facets)
 
-    eligible_products = [p for p in PRODUCTS if p.get('price_inr') is not None and p.get('price_inr') <= budget]
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
 
-    if not eligible_products:
-        return jsonify([]) # Return empty list if no products meet budget
+@app.after_request
+def record_request(response):
+    # Labelled by URL rule, not path, so unknown paths can't create unbounded series
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method)
+        REQUESTS.inc(route, request.method, str(response.status_code))
+    return response
 
-    # Sort by value score (descending) then by price (ascending) as a tie-breaker
-    # best_value_products = sorted(
-    #     eligible_products,
-    #     key=lambda p: (get_value_score(p), -p.get('price_inr', 0)), # Higher score first, then lower price
-    #     reverse=True
-    # )
-    # New strategy: most expensive product within budget
-    best_value_products = sorted(
-        eligible_products,
-        key=lambda p: p.get('price_inr', 0),
-        reverse=True # Most expensive first
-    )
+@app.errorhandler(BadQuery)
+def bad_query(error):
+    return jsonify({"error": str(error)}), 400
 
+@app.errorhandler(NotRecorded)
+def not_recorded(error):
+    return jsonify({"error": str(error)}), 404
 
+
+def send_cached(entry, revalidate=True):
+    # Picks the pre-compressed body the client accepts, brotli before gzip. Cache-Control: no-cache
+    # makes browsers revalidate every time, which costs them a 304 instead of the whole body.
+    if entry.brotli is not None and request.accept_encodings['br'] > 0:
+        body, etag, encoding = entry.brotli, entry.brotli_etag, 'br'
+    elif entry.gzipped is not None and request.accept_encodings['gzip'] > 0:
+        body, etag, encoding = entry.gzipped, entry.gzip_etag, 'gzip'
+    else:
+        body, etag, encoding = entry.body, entry.etag, None
+    if revalidate and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=entry.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/status')
+def status():
+    # Top-level fields describe the default region; "regions" covers every region currently in memory
+    return jsonify({
+        **DEFAULT_SHARD.status(),
+        "startup_seconds": round(STARTUP_SECONDS, 4),
+        "response_cache": RESPONSE_CACHE.stats(),
+        "regions": {code: shard.status() for code, shard in SHARDS.loaded().items()},
+        "fx": FX.describe(),
+    })
+
+@app.route('/')
+def index():
+    # Only the first ladder page is inlined; the page fetches the rest from /ladder as it is scrolled,
+    # so its size and render time don't grow with the catalogue. Rendered and compressed once per
+    # catalogue version, not once per request.
+    shard = shard_for(request.args.get('region'))
+    catalogue, region = shard.catalogue, shard.region
+    entry = RESPONSE_CACHE.get_or_build(('index', region.code, catalogue.version), lambda: make_body(
+        render_template('index.html', ladder=ladder_page(catalogue, region, 0), region=region, regions=REGIONS.values()), 'text/html'))
+    return send_cached(entry)
+
+@app.route('/ladder')
+def ladder_api():
+    # The price-sorted catalogue, one page at a time: GET /ladder?cursor=<next_cursor of the previous page>
+    shard = shard_for(request.args.get('region'))
+    catalogue = shard.catalogue
+    try:
+        start = catalogue.ladder_start(request.args.get('cursor'))
+        limit = int(request.args.get('limit', LADDER_PAGE_SIZE))
+    except ValueError:
+        raise BadQuery("Invalid cursor or limit")
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise BadQuery(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    entry = RESPONSE_CACHE.get_or_build(('ladder', shard.region.code, catalogue.version, start, limit), lambda: make_body(
+        app.json.response(ladder_page(catalogue, shard.region, start, limit)).get_data(), 'application/json'))
+    return send_cached(entry)
+
+@app.route('/find_products', methods=['GET', 'POST'])
+def find_products_api():
+    data = request_data()
+    budget, facets, rank_by, weights = parse_query(data)
+    shard = shard_for(data.get('region'))
+    catalogue = shard.catalogue
+    weights = regional_weights(weights, shard.region)
+
+    # Budgets between the same two price breakpoints share one cached answer
+    key = ('find', shard.region.code, catalogue.version, rank_by, tuple(facets.get(field) for field in FACET_FIELDS),
+           catalogue.budget_bucket(budget, **facets), tuple(weights.tolist()) if weights is not None else None)
     # For now, let's return up to 5 best value products, or fewer if not many are eligible
-    # Or just the top one if that's the desired behavior
-    return jsonify(best_value_products[:5])
+    entry = RESPONSE_CACHE.get_or_build(key, lambda: make_body(
+        app.json.response([dict(p) for p in find(catalogue, budget, facets, rank_by, weights)]).get_data(), 'application/json'))
+    return send_cached(entry, revalidate=request.method == 'GET')
+
+@app.route('/search', methods=['GET', 'POST'])
+def search_api():
+    # Any combination of spec ranges, price range, category and chip, sorted and paginated, e.g.
+    # GET /search?min_ram_gb=16&min_storage_tb=0.5&min_screen_size_inch=14&max_screen_size_inch=14&max_price=150000
+    data = request_data()
+    ranges, facets, sort, descending, offset, limit, weights = parse_search(data)
+    shard = shard_for(data.get('region'))
+    catalogue = shard.catalogue
+    weights = regional_weights(weights, shard.region)
+
+    # Criteria matching the same rows share one cached answer
+    criteria = catalogue.search_key(ranges, facets)
+    key = ('search', shard.region.code, catalogue.version, criteria, sort, descending, offset, limit,
+           tuple(weights.tolist()) if weights is not None else None)
+
+    def build():
+        total, products = catalogue.search(criteria, sort, descending, offset, limit, weights)
+        return make_body(app.json.response({
+            "total": total, "offset": offset, "limit": limit, "sort": sort, "descending": descending,
+            "region": shard.region.code, "price_field": shard.region.price_field,
+            "products": [dict(p) for p in products]}).get_data(), 'application/json')
+    return send_cached(RESPONSE_CACHE.get_or_build(key, build), revalidate=request.method == 'GET')
+
+@app.route('/compare', methods=['GET', 'POST'])
+def compare_regions_api():
+    # The same query in several regions, with the budget given once in `currency` and converted per
+    # region through the cached FX table, e.g. {"budget": 150000, "currency": "INR", "regions": ["in", "us"]}.
+    # Without "regions" only the regions already in memory are compared. Named regions that aren't in
+    # memory are read from disk and kept aside until the file changes or they go idle, so compare never
+    # loads, refreshes or scrapes one.
+    data = request_data()
+    budget, facets, rank_by, weights = parse_query(data)
+    codes = data.get('regions') or list(SHARDS.loaded())
+    if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+        raise BadQuery("regions must be a list of region codes")
+    currency = data.get('currency', REGIONS[DEFAULT_REGION].currency)
+    if not isinstance(currency, str) or currency.upper() not in FX.rates:
+        raise BadQuery(f"Unknown currency '{currency}'")
+    currency = currency.upper()
+
+    results = {}
+    for code in dict.fromkeys(code.lower() for code in codes):
+        shard = shard_for(code, peek=True)
+        region = shard.region
+        local_budget = FX.convert(budget, currency, region.currency)
+        products = []
+        for product in find(shard.catalogue, local_budget, facets, rank_by, regional_weights(weights, region)):
+            product = dict(product)
+            price = product.get(region.price_field)
+            product["converted_price"] = round(FX.convert(price, region.currency, currency), 2) if price is not None else None
+            products.append(product)
+        results[region.code] = {"currency": region.currency, "budget": round(local_budget, 2), "products": products,
+                                "catalogue_version": shard.catalogue.version}
+    return jsonify({"currency": currency, "fx": FX.describe(), "regions": results})
+
+@app.route('/price_history', methods=['GET', 'POST'])
+def price_history_api():
+    # Every price change of one product, oldest first, e.g. GET /price_history?part_number=MX2E3HN/A&since=2025-01-01
+    data = request_data()
+    shard = shard_for(data.get('region'))
+    product = history_product(shard, data)
+    since, until = parse_time(data, 'since'), parse_time(data, 'until')
+    return jsonify({"product": product, "currency": shard.region.currency, "lowest": shard.history.lowest(product["id"]),
+                    "prices": shard.history.history(product["id"], since, until)})
+
+@app.route('/price_history/lowest', methods=['GET', 'POST'])
+def lowest_price_api():
+    data = request_data()
+    shard = shard_for(data.get('region'))
+    product = history_product(shard, data)
+    lowest = shard.history.lowest(product["id"])
+    current = product[shard.region.price_field]
+    return jsonify({"product": product, "currency": shard.region.currency, "lowest": lowest,
+                    "is_lowest_now": lowest is not None and current is not None and current <= lowest["price"]})
+
+@app.route('/price_drops', methods=['GET', 'POST'])
+def price_drops_api():
+    # Price decreases in the last `hours` (default a week) or since `since`, newest first, optionally
+    # of at least `min_percent`, in one category, or of one product (part_number or id)
+    data = request_data()
+    shard = shard_for(data.get('region'))
+    since = parse_time(data, 'since')
+    try:
+        hours = float(data.get('hours', DROP_WINDOW_HOURS))
+        min_percent = float(data.get('min_percent', 0))
+        limit = int(data.get('limit', MAX_DROPS))
+    except (TypeError, ValueError):
+        raise BadQuery("hours, min_percent and limit must be numbers")
+    if not (math.isfinite(hours) and math.isfinite(min_percent)) or hours < 0 or not 0 < limit <= MAX_DROPS:
+        raise BadQuery(f"hours must be 0 or more and limit between 1 and {MAX_DROPS}")
+    if since is None:
+        since = time.time() - hours * 3600
+    # The history starts after 1970: an earlier start (or a window of, say, 1e12 hours) means all of it
+    since = max(since, 0)
+    category = data.get('category')
+    if category is not None and not isinstance(category, str):
+        raise BadQuery("Invalid filter format")
+    product_id = history_product(shard, data)["id"] if data.get('part_number') is not None or data.get('id') is not None else None
+    drops = shard.history.drops(int(since), min_percent, category, product_id, limit)
+    return jsonify({"currency": shard.region.currency, "since": datetime.fromtimestamp(since).isoformat(), "drops": drops})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus text format. Each gunicorn worker keeps its own numbers.
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def profile():
+    # GET returns the samples so far as collapsed stacks (flamegraph.pl / speedscope input).
+    # POST {"enabled": true, "seconds": 60} starts a fresh profile, {"enabled": false} stops it.
+    if PROFILER is None:
+        abort(404)
+    if request.method == 'GET':
+        return Response(PROFILER.report(), mimetype='text/plain')
+    data = request_data()
+    seconds = data.get('seconds')
+    if seconds is not None and (not isinstance(seconds, (int, float)) or seconds <= 0):
+        raise BadQuery("seconds must be a positive number")
+    if data.get('enabled'):
+        PROFILER.start(seconds)
+    else:
+        PROFILER.stop()
+    return jsonify(PROFILER.describe())
 
 
 if __name__ == '__main__':
-    if not PRODUCTS:
+    if not DEFAULT_SHARD.catalogue.products:
         print("CRITICAL: No products were loaded. The scraper might have failed and no previous data file was found.")
         print("Please check scraper.py output or run it manually (python scraper.py) to generate apple_products.json")
     app.run(host='0.0.0.0', port=10001, debug=True)
\ No newline at end of file
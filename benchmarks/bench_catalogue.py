@@ -0,0 +1,101 @@
+import random
+import sys
+import time
+
+from catalogue import Catalogue
+from scoring import get_value_score, weight_vector
+
+# Budget queries against the price index versus the original filter-and-sort, vectorized value
+# ranking versus scoring one dict at a time, and spec searches against the bitset index versus a
+# scan, on synthetic catalogues. Run from the repository root: python -m benchmarks.bench_catalogue
+SIZES = (100, 10_000, 100_000)
+CATEGORIES = ("MacBook Air", "MacBook Pro", "iMac", "Mac mini", "Mac Studio", "iPhone")
+QUERIES = 200
+
+
+def synthetic_products(count, seed=7):
+    rng = random.Random(seed)
+    return [{"name": f"Product {i}", "category": rng.choice(CATEGORIES), "chip": f"Apple M{rng.randint(1, 4)} chip",
+             "price_inr": float(rng.randrange(40_000, 600_000, 1000)), "ram_gb": rng.choice((8, 16, 24, 32, 64)),
+             "storage_tb": rng.choice((0.256, 0.512, 1, 2)), "cpu_cores": rng.randint(8, 16), "gpu_cores": rng.randint(8, 40),
+             "screen_size_inch": rng.choice((0, 13, 14, 15, 16, 24))} for i in range(count)]
+
+
+def legacy_best_value(products, budget, weights):
+    eligible = [p for p in products if p.get('price_inr') is not None and p.get('price_inr') <= budget]
+    return sorted(eligible, key=lambda p: (get_value_score(p, weights), -p.get('price_inr', 0)), reverse=True)[:5]
+
+
+def legacy_find(products, budget):
+    eligible = [p for p in products if p.get('price_inr') is not None and p.get('price_inr') <= budget]
+    return sorted(eligible, key=lambda p: p.get('price_inr', 0), reverse=True)[:5]
+
+
+def legacy_search(products, min_ram, min_storage, max_price, category):
+    eligible = [p for p in products if p["ram_gb"] >= min_ram and p["storage_tb"] >= min_storage
+                and p["price_inr"] <= max_price and p["category"] == category]
+    return len(eligible), sorted(eligible, key=lambda p: p["price_inr"])[:20]
+
+
+def main():
+    rng = random.Random(11)
+    for size in SIZES:
+        products = synthetic_products(size)
+        started = time.perf_counter()
+        catalogue = Catalogue(products)
+        build = time.perf_counter() - started
+        budgets = [float(rng.randrange(30_000, 650_000)) for _ in range(QUERIES)]
+
+        started = time.perf_counter()
+        expected = [legacy_find(products, b) for b in budgets]
+        legacy = (time.perf_counter() - started) / QUERIES
+        started = time.perf_counter()
+        got = [catalogue.find_under_budget(b) for b in budgets]
+        indexed = (time.perf_counter() - started) / QUERIES
+        started = time.perf_counter()
+        for b in budgets: catalogue.find_under_budget(b, category="iMac")
+        faceted = (time.perf_counter() - started) / QUERIES
+
+        status = "same results" if got == expected else "RESULTS DIFFER"
+        print(f"{size:>7} products: build {build * 1000:8.1f} ms | filter+sort {legacy * 1e6:10.1f} us/query | "
+              f"index {indexed * 1e6:6.1f} us/query | category index {faceted * 1e6:6.1f} us/query | {status}")
+        if got != expected:
+            return 1
+
+        weights = {"ram_gb": 30000, "screen_size_inch": 2000}
+        value_queries = budgets[:max(1, QUERIES // (size // 1000 or 1))]
+        started = time.perf_counter()
+        expected = [legacy_best_value(products, b, weights) for b in value_queries]
+        legacy = (time.perf_counter() - started) / len(value_queries)
+        vector = weight_vector(weights)
+        catalogue.find_best_value(0, weights=vector)  # Builds the score columns
+        started = time.perf_counter()
+        got = [catalogue.find_best_value(b, weights=vector) for b in value_queries]
+        vectorized = (time.perf_counter() - started) / len(value_queries)
+        status = "same results" if got == expected else "RESULTS DIFFER"
+        print(f"{'':>7}           value ranking: per-dict {legacy * 1e6:10.1f} us/query | vectorized {vectorized * 1e6:8.1f} us/query | {status}")
+        if got != expected:
+            return 1
+
+        searches = [(rng.choice((8, 16, 32)), rng.choice((0.256, 0.512, 1)), b, rng.choice(CATEGORIES)) for b in budgets]
+        started = time.perf_counter()
+        expected = [legacy_search(products, *query) for query in searches]
+        legacy = (time.perf_counter() - started) / QUERIES
+        catalogue.search(catalogue.search_key())  # Builds the spec index
+        started = time.perf_counter()
+        got = []
+        for min_ram, min_storage, max_price, category in searches:
+            key = catalogue.search_key({"ram_gb": (min_ram, None), "storage_tb": (min_storage, None),
+                                        "price": (None, max_price)}, {"category": [category]})
+            got.append(catalogue.search(key))
+        indexed = (time.perf_counter() - started) / QUERIES
+        status = "same results" if [(t, [p["name"] for p in page]) for t, page in got] == \
+            [(t, [p["name"] for p in page]) for t, page in expected] else "RESULTS DIFFER"
+        print(f"{'':>7}             spec search: scan {legacy * 1e6:13.1f} us/query | bitsets {indexed * 1e6:11.1f} us/query | {status}")
+        if status != "same results":
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fetcher import FetchEngine
+
+# Exercises FetchEngine against a local stub server whose paths misbehave on purpose: retries on 5xx,
+# Retry-After on 429, no retry on 404, the per-host concurrency limit, the rate limit, the total
+# deadline, and iter_fetch's deadline covering fetch time only. Exits non-zero if any check fails.
+# Run from the repository root: python -m benchmarks.bench_fetcher
+SLOW_SECONDS = 0.2   # How long /slow takes to answer
+
+
+class StubServer:
+    # /flaky/<key>: 503 twice, then 200      /limited/<key>: 429 with Retry-After: 1, then 200
+    # /missing: 404                           /down: always 503
+    # /slow/<n>: 200 after SLOW_SECONDS      /ok/<n>: 200
+    def __init__(self):
+        self.hits = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.hits[self.path] = stub.hits.get(self.path, 0) + 1
+                    hits = stub.hits[self.path]
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    if self.path.startswith('/slow/'):
+                        time.sleep(SLOW_SECONDS)
+                    if self.path == '/missing':
+                        self.send_error(404)
+                    elif self.path == '/down' or (self.path.startswith('/flaky/') and hits <= 2):
+                        self.send_error(503)
+                    elif self.path.startswith('/limited/') and hits == 1:
+                        self.send_response(429)
+                        self.send_header('Retry-After', '1')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                    else:
+                        body = self.path.encode()
+                        self.send_response(200)
+                        self.send_header('Content-Length', str(len(body)))
+                        self.end_headers()
+                        self.wfile.write(body)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def reset(self):
+        with self.lock:
+            self.max_in_flight = 0
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def engine(**options):
+    # Fast backoff and a generous rate unless a check says otherwise
+    return FetchEngine(**{"rate": 1000, "burst": 1000, "backoff": 0.05, **options})
+
+
+def main():
+    stub = StubServer()
+    failures = []
+
+    def check(name, ok, detail):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        result = engine().fetch(stub.url('/flaky/a'))
+        check("retries 5xx", result.error is None and result.attempts == 3 and result.content == b'/flaky/a',
+              f"{result.attempts} attempt(s), error {result.error}")
+
+        result = engine(max_retries=1).fetch(stub.url('/flaky/b'))
+        check("gives up after max_retries", result.error == "HTTP 503" and result.attempts == 2,
+              f"{result.attempts} attempt(s), error {result.error}")
+
+        result = engine().fetch(stub.url('/limited/a'))
+        check("waits for Retry-After on 429", result.error is None and result.attempts == 2 and result.elapsed >= 1.0,
+              f"{result.attempts} attempt(s) in {result.elapsed:.2f}s")
+
+        result = engine().fetch(stub.url('/missing'))
+        check("no retry on 404", result.status == 404 and result.attempts == 1 and result.error is not None,
+              f"status {result.status}, {result.attempts} attempt(s)")
+
+        stub.reset()
+        urls = [stub.url(f'/slow/{n}') for n in range(8)]
+        started = time.monotonic()
+        results = engine(max_workers=8, per_host_limit=2).fetch_all(urls)
+        elapsed = time.monotonic() - started
+        check("per-host limit", stub.max_in_flight == 2 and all(r.error is None for r in results),
+              f"at most {stub.max_in_flight} request(s) in flight, {elapsed:.2f}s for {len(urls)}")
+        check("fetch_all keeps order", [r.url for r in results] == urls, "results in request order")
+
+        urls = [stub.url(f'/ok/{n}') for n in range(6)]
+        started = time.monotonic()
+        engine(rate=10, burst=1).fetch_all(urls)
+        elapsed = time.monotonic() - started
+        check("rate limit", elapsed >= 0.45, f"{len(urls)} requests at 10/s with burst 1 took {elapsed:.2f}s")
+
+        started = time.monotonic()
+        result = engine(backoff=0.2, max_retries=10, total_deadline=1).fetch(stub.url('/down'))
+        elapsed = time.monotonic() - started
+        check("total deadline", result.error is not None and "deadline" in result.error and elapsed < 1.5,
+              f"stopped after {result.attempts} attempt(s) in {elapsed:.2f}s: {result.error}")
+
+        # A consumer that parses slower than the deadline allows must not starve later fetches
+        urls = [stub.url(f'/ok/iter-{n}') for n in range(5)]
+        errors = []
+        for result in engine(max_workers=1, total_deadline=0.5).iter_fetch(urls, window=1):
+            errors.append(result.error)
+            time.sleep(0.3)
+        check("iter_fetch deadline counts fetch time only", errors == [None] * len(urls),
+              f"{sum(e is None for e in errors)}/{len(urls)} fetched with 1.5s of consumer time against a 0.5s deadline")
+    finally:
+        stub.close()
+    print(f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
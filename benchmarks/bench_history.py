@@ -0,0 +1,59 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_catalogue import synthetic_products
+from price_history import PriceHistory, record_snapshot
+
+# A year of hourly scrapes written into the price history, then the queries the app runs on it:
+# one product's history, its lowest price, and drops over the last week and over everything.
+# Each price moves about once a month on average, so most runs record nothing.
+# Run from the repository root: python -m benchmarks.bench_history
+PRODUCTS = 200
+YEARS = 1
+CHANGE_PROBABILITY = 0.002   # Per product per hourly run
+QUERIES = 200
+
+
+def main():
+    rng = random.Random(5)
+    products = synthetic_products(PRODUCTS)
+    for i, product in enumerate(products):
+        product["url"] = f"https://www.apple.com/in/shop/buy-mac/{i}"
+        product["part_numbers"] = [f"Z{i:04d}HN/A"]
+    runs = YEARS * 365 * 24
+    started_at = time.time() - runs * 3600
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'price_history.db')
+        changes = 0
+        started = time.perf_counter()
+        for run in range(runs):
+            for product in products:
+                if rng.random() < CHANGE_PROBABILITY:
+                    product["price_inr"] = round(product["price_inr"] * rng.uniform(0.9, 1.08), -2)
+            changes += record_snapshot(products, 'price_inr', path, observed_at=started_at + run * 3600)
+        write = (time.perf_counter() - started) / runs
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"{runs} hourly runs x {PRODUCTS} products: {changes} price rows instead of {runs * PRODUCTS} snapshots, "
+              f"{size / 1e6:.1f} MB, {write * 1000:.2f} ms/run")
+
+        history = PriceHistory(path, 'price_inr')
+        ids = [rng.randint(1, PRODUCTS) for _ in range(QUERIES)]
+        week_ago = int(time.time() - 7 * 24 * 3600)
+        for label, query in (("history", lambda i: history.history(i)),
+                             ("history, last 30 days", lambda i: history.history(i, time.time() - 30 * 24 * 3600)),
+                             ("lowest", lambda i: history.lowest(i)),
+                             ("by part number", lambda i: history.find_product(part_number=f"Z{i - 1:04d}HN/A")),
+                             ("drops, last week", lambda i: history.drops(week_ago)),
+                             ("drops >5%, all time", lambda i: history.drops(0, 5))):
+            started = time.perf_counter()
+            for i in ids:
+                query(i)
+            print(f"  {label:<22} {(time.perf_counter() - started) / QUERIES * 1e6:9.1f} us/query")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
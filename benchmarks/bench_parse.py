@@ -0,0 +1,54 @@
+import contextlib
+import io
+import sys
+import time
+import tracemalloc
+
+import scraper
+
+# Compares the full-soup and streaming parsing modes on the checked-in 13-inch MacBook Air page.
+# Run from the repository root: python -m benchmarks.bench_parse [rounds]
+SNAPSHOT_FILE = 'benchmarks/fixtures/buy-mac-macbook-air-13-inch.html'
+SNAPSHOT_URL = 'https://www.apple.com/in/shop/buy-mac/macbook-air/13-inch'
+
+
+def scrape_once(mode, content):
+    scraper.PARSER_MODE = mode
+    with contextlib.redirect_stdout(io.StringIO()):
+        products = scraper.scrape_mac_page('Macbook Air 13 Inch', SNAPSHOT_URL, 'MacBook Air', content)
+    return [{k: v for k, v in p.items() if k != 'scraped_at'} for p in products]
+
+
+def measure(mode, content, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        products = scrape_once(mode, content)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    scrape_once(mode, content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return products, min(timings), sorted(timings)[len(timings) // 2], peak
+
+
+def main(rounds=10):
+    with open(SNAPSHOT_FILE, 'rb') as f:
+        content = f.read()
+    original_mode = scraper.PARSER_MODE
+    results = {mode: measure(mode, content, rounds) for mode in ('soup', 'stream')}
+    scraper.PARSER_MODE = original_mode
+    print(f"{SNAPSHOT_FILE}: {len(content) / 1024:.0f} KB, {rounds} rounds")
+    for mode, (products, best, median, peak) in results.items():
+        print(f"  {mode:<6} best {best * 1000:7.1f} ms  median {median * 1000:7.1f} ms  peak {peak / 1024 / 1024:6.1f} MB  {len(products)} product(s)")
+    soup_best, stream_best = results['soup'][1], results['stream'][1]
+    print(f"  speed-up: {soup_best / stream_best:.1f}x")
+    if results['soup'][0] != results['stream'][0]:
+        print("  MISMATCH: parsing modes produced different products")
+        return 1
+    print("  products identical in both modes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10))
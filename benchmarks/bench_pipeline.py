@@ -0,0 +1,93 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import incremental
+import pipeline
+from benchmarks.bench_catalogue import synthetic_products
+from catalogue_store import ColumnarCatalogue, write_columnar
+
+# The end of a scraper run on a large catalogue: diff against the previous run and write the
+# columnar file. In memory, both JSON files are loaded whole; streamed, the previous catalogue goes
+# through a PageStore, the diff merges key-sorted runs on disk and the columnar file is written in
+# two passes over the JSON. Checks both give the same changes and the same columnar rows, and
+# reports time and peak Python memory. Exits non-zero on a mismatch.
+# Run from the repository root: python -m benchmarks.bench_pipeline
+PRODUCTS = 100_000
+CHURN = 0.01   # Share of products added, removed and repriced between the two runs
+
+
+def catalogues():
+    rng = random.Random(11)
+    old = synthetic_products(PRODUCTS)
+    for i, product in enumerate(old):
+        product["url"] = f"https://www.apple.com/in/shop/buy-mac/{i % 500}"
+    new = [dict(product) for product in old if rng.random() >= CHURN]
+    for product in new:
+        if rng.random() < CHURN:
+            product["price_inr"] += 1000
+    added = synthetic_products(int(PRODUCTS * CHURN), seed=12)
+    for i, product in enumerate(added):
+        product.update(name=f"New product {i}", url=f"https://www.apple.com/in/shop/buy-mac/{i % 500}")
+    return old, new + added
+
+
+def in_memory(old_path, new_path, columnar_path):
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    changes = incremental.diff_catalogues(old, new)
+    write_columnar(new, columnar_path)
+    return changes
+
+
+def streamed(old_path, new_path, columnar_path):
+    previous = pipeline.PageStore(pipeline.iter_json_array(old_path), incremental.key_order)
+    changes = incremental.diff_catalogue_streams(previous.records(), enumerate(pipeline.iter_json_array(new_path)), old_sorted=True)
+    write_columnar(lambda: pipeline.iter_json_array(new_path), columnar_path)
+    previous.close()
+    return changes
+
+
+def measure(run, *args):
+    # Timed on its own first: tracemalloc slows allocation-heavy code several times over
+    started = time.perf_counter()
+    result = run(*args)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    run(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    old, new = catalogues()
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path, new_path = os.path.join(tmp, 'old.json'), os.path.join(tmp, 'new.json')
+        pipeline.write_json_array(old, old_path)
+        pipeline.write_json_array(new, new_path)
+        del old, new
+        results = {}
+        for label, run in (("in memory", in_memory), ("streamed", streamed)):
+            columnar_path = os.path.join(tmp, f'{label}.avfc')
+            changes, elapsed, peak = measure(run, old_path, new_path, columnar_path)
+            results[label] = (changes, columnar_path)
+            print(f"{label:<10} {elapsed:6.2f} s  peak {peak / 1e6:6.1f} MB  ({incremental.summarize(changes)})")
+        same_changes = results["in memory"][0] == results["streamed"][0]
+        stores = [ColumnarCatalogue(path) for _, path in results.values()]
+        same_rows = [dict(p) for p in stores[0]] == [dict(p) for p in stores[1]]
+        for store in stores:
+            store.close()
+    print(f"{PRODUCTS} products: {'same changes' if same_changes else 'CHANGES DIFFER'}, "
+          f"{'same columnar rows' if same_rows else 'COLUMNAR ROWS DIFFER'}")
+    return 0 if same_changes and same_rows else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
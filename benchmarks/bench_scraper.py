@@ -0,0 +1,278 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import scraper
+import specs
+from catalogue_store import write_columnar
+from fetcher import FetchEngine
+
+# End-to-end scraper benchmark on saved pages. Every URL in USER_PROVIDED_URLS that has a fixture is
+# served by a local HTTP stub, fetched through FetchEngine and scraped with scrape_page (embedded-data
+# discovery, falling back to the tile parsers), timing each stage, then compared against the stored baseline.
+# Run from the repository root:
+#   python -m benchmarks.bench_scraper [rounds] [--soup]   compare against the baseline
+#   python -m benchmarks.bench_scraper --save-baseline       replace the baseline with this run
+#   python -m benchmarks.bench_scraper --record              download missing fixtures from apple.com
+FIXTURES_DIR = os.path.join('benchmarks', 'fixtures')
+BASELINE_FILE = os.path.join('benchmarks', 'baseline_scraper.json')
+STAGES = ('fetch', 'parse', 'select', 'specs', 'serialize')
+REGRESSION_TOLERANCE = 0.20  # Slower than the baseline by more than this (and by over 1 ms) is flagged
+DEFAULT_ROUNDS = 5
+
+
+def fixture_path(url):
+    path = unquote(urlsplit(url).path).split('/shop/', 1)[-1]
+    return os.path.join(FIXTURES_DIR, re.sub(r'[^A-Za-z0-9.]+', '-', path).strip('-') + '.html')
+
+
+def load_fixtures():
+    fixtures, missing = {}, []
+    for item in scraper.PROCESSED_URLS:
+        try:
+            with open(fixture_path(item["url"]), 'rb') as f:
+                fixtures[item["url"]] = f.read()
+        except OSError:
+            missing.append(item["url"])
+    return fixtures, missing
+
+
+def record_fixtures(overwrite=False):
+    engine = FetchEngine(headers=scraper.HEADERS)
+    urls = [item["url"] for item in scraper.PROCESSED_URLS if overwrite or not os.path.exists(fixture_path(item["url"]))]
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for result in engine.fetch_all(urls):
+        if result.error:
+            print(f"  {result.url}: {result.error}")
+            continue
+        with open(fixture_path(result.url), 'wb') as f:
+            f.write(result.content)
+        print(f"  saved {fixture_path(result.url)} ({len(result.content) / 1024:.0f} KB)")
+    engine.close()
+
+
+class FixtureServer:
+    # Serves each fixture at /<n> on a loopback port, so the fetch stage runs the real HTTP client
+    def __init__(self, pages):
+        bodies = list(pages)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    body = bodies[int(self.path.strip('/'))]
+                except (ValueError, IndexError):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, n):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/{n}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - started
+        return timed
+
+
+@contextlib.contextmanager
+def timed_scraper(timer):
+    # Wraps the scraper's stage functions in place. In stream mode parsing and selection are one
+    # pass (the extractors), so 'select' stays at zero; in soup mode they are get_soup and *_from_soup.
+    # Pages with embedded product data are parsed by extract_configurations and described by discover_products.
+    stages = {'extract_configurations': 'parse', 'discover_products': 'specs',
+              'extract_mac_page': 'parse', 'extract_iphone_page': 'parse', 'get_soup': 'parse',
+              'mac_page_from_soup': 'select', 'iphone_page_from_soup': 'select', 'extract_price_from_text': 'specs',
+              'parse_mac_specs': 'specs', 'parse_iphone_specs_from_name': 'specs'}
+    originals = {name: getattr(scraper, name) for name in stages}
+    for name, stage in stages.items():
+        setattr(scraper, name, timer.wrap(stage, originals[name]))
+    try:
+        yield timer
+    finally:
+        for name, func in originals.items():
+            setattr(scraper, name, func)
+
+
+def run_round(server, items):
+    timer = StageTimer()
+    specs._mac_specs.cache_clear()
+    specs._iphone_specs.cache_clear()
+    engine = FetchEngine(headers=scraper.HEADERS, rate=1e9, burst=1e9)
+    started = time.perf_counter()
+    results = engine.fetch_all([server.url(n) for n in range(len(items))])
+    timer.seconds['fetch'] = time.perf_counter() - started
+    engine.close()
+    failed = [item["url"] for item, result in zip(items, results) if result.error]
+    if failed:
+        raise RuntimeError(f"Stub fetch failed for {failed}")
+
+    products_by_url = {}
+    with timed_scraper(timer), contextlib.redirect_stdout(io.StringIO()):
+        for item, result in zip(items, results):
+            products_by_url[item["url"]] = scraper.scrape_page(item, result.content)
+
+    products = [p for url_products in products_by_url.values() for p in url_products]
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, 'products.json'), 'w', encoding='utf-8') as f:
+            json.dump(products, f, indent=4, ensure_ascii=False)
+        write_columnar(products, os.path.join(tmp, 'products.avfc'))
+    timer.seconds['serialize'] = time.perf_counter() - started
+    return timer.seconds, products_by_url
+
+
+def output_digest(products_by_url):
+    # Count and content hash per URL, ignoring scrape timestamps
+    digest = {}
+    for url, products in products_by_url.items():
+        stable = [{k: v for k, v in p.items() if k != 'scraped_at'} for p in products]
+        digest[url] = {"products": len(stable),
+                       "sha256": hashlib.sha256(json.dumps(stable, sort_keys=True).encode('utf-8')).hexdigest()}
+    return digest
+
+
+def benchmark(fixtures, rounds):
+    items = [item for item in scraper.PROCESSED_URLS if item["url"] in fixtures]
+    server = FixtureServer(fixtures[item["url"]] for item in items)
+    try:
+        run_round(server, items)  # Warm-up: imports, connection pool, lxml
+        timings = []
+        for _ in range(rounds):
+            seconds, products_by_url = run_round(server, items)
+            timings.append(seconds)
+        tracemalloc.start()
+        run_round(server, items)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        server.close()
+    stages = {stage: statistics.median(t[stage] for t in timings) for stage in STAGES}
+    total = statistics.median(sum(t.values()) for t in timings)
+    product_count = sum(len(p) for p in products_by_url.values())
+    return {"mode": scraper.PARSER_MODE, "rounds": rounds, "pages": len(items),
+            "bytes": sum(len(fixtures[item["url"]]) for item in items), "stages": stages, "total": total,
+            "peak_bytes": peak, "products_per_second": product_count / total if total else 0.0,
+            "output": output_digest(products_by_url)}
+
+
+def load_baselines():
+    try:
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(result):
+    baselines = load_baselines()
+    baselines[result["mode"]] = {**result, "recorded_at": datetime.now().isoformat(timespec='seconds'),
+                                 "python": platform.python_version(), "machine": platform.machine()}
+    with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=4, sort_keys=True)
+        f.write('\n')
+
+
+def compare(result, baseline):
+    # Prints the run next to the baseline; returns the stages that regressed and whether the output changed
+    regressed = []
+    print(f"{'stage':<10} {'ms':>9} {'baseline':>9} {'change':>8}")
+    for stage in STAGES + ('total',):
+        now = result["total"] if stage == 'total' else result["stages"][stage]
+        line = f"{stage:<10} {now * 1000:9.1f}"
+        if baseline:
+            before = baseline["total"] if stage == 'total' else baseline["stages"].get(stage, 0.0)
+            change = f"{(now - before) / before * 100:+7.0f}%" if before else '       -'
+            flag = ''
+            if before and now - before > max(before * REGRESSION_TOLERANCE, 0.001):
+                regressed.append(stage)
+                flag = '  SLOWER'
+            line += f" {before * 1000:9.1f} {change}{flag}"
+        print(line)
+    print(f"peak memory {result['peak_bytes'] / 1024 / 1024:.1f} MB"
+          + (f" (baseline {baseline['peak_bytes'] / 1024 / 1024:.1f} MB)" if baseline else ''))
+    print(f"throughput  {result['products_per_second']:.0f} products/s"
+          + (f" (baseline {baseline['products_per_second']:.0f})" if baseline else ''))
+    output_changed = bool(baseline) and baseline.get("output") != result["output"]
+    return regressed, output_changed
+
+
+def main(argv):
+    if '--record' in argv:
+        record_fixtures(overwrite='--overwrite' in argv)
+        return 0
+    rounds = next((int(arg) for arg in argv if arg.isdigit()), DEFAULT_ROUNDS)
+    original_mode = scraper.PARSER_MODE
+    scraper.PARSER_MODE = 'soup' if '--soup' in argv else 'stream'
+    try:
+        fixtures, missing = load_fixtures()
+        if not fixtures:
+            print(f"No fixtures in {FIXTURES_DIR}; run with --record first.")
+            return 1
+        result = benchmark(fixtures, rounds)
+    finally:
+        scraper.PARSER_MODE = original_mode
+    products = sum(entry["products"] for entry in result["output"].values())
+    print(f"{result['mode']} mode: {result['pages']} page(s), {result['bytes'] / 1024:.0f} KB, {products} product(s), "
+          f"median of {rounds} rounds")
+    if missing:
+        print(f"{len(missing)} URL(s) have no fixture and were skipped (python -m benchmarks.bench_scraper --record)")
+    if '--save-baseline' in argv:
+        compare(result, None)
+        save_baseline(result)
+        print(f"Saved baseline to {BASELINE_FILE}")
+        return 0
+    baseline = load_baselines().get(result["mode"])
+    if baseline is None:
+        print(f"No {result['mode']} baseline in {BASELINE_FILE}; run with --save-baseline to create one.")
+    elif baseline["pages"] != result["pages"]:
+        print(f"Baseline covers {baseline['pages']} page(s), this run {result['pages']}; re-save the baseline.")
+        baseline = None
+    regressed, output_changed = compare(result, baseline)
+    if output_changed:
+        changed = [url for url in result["output"] if baseline["output"].get(url) != result["output"][url]]
+        print(f"OUTPUT CHANGED for {len(changed)} page(s): {', '.join(changed)}")
+        return 1
+    if regressed:
+        print(f"Slower than baseline: {', '.join(regressed)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,168 @@
+import json
+import random
+import re
+import sys
+import time
+
+import specs
+from page_extractor import extract_mac_page
+
+# Golden check and micro-benchmark for specs.py against the original per-pattern parsers.
+# Inputs come from apple_products.json, apple_products_test.json, the saved 13-inch page and
+# randomly assembled spec strings. Run from the repository root: python -m benchmarks.bench_specs
+PRODUCTS_FILE = 'apple_products.json'
+TEST_PRODUCTS_FILE = 'apple_products_test.json'
+SNAPSHOT_FILE = 'benchmarks/fixtures/buy-mac-macbook-air-13-inch.html'
+FUZZ_CASES = 2000
+FUZZ_TOKENS = ['Apple', 'M1', 'M4', 'M2 Pro', 'M3 Max', 'm4', 'Ultra', 'chip', 'Apple M4 Pro chip', '10-core', '8-core', 'CPU',
+               'GPU', 'cpu', '16GB', '24GB', 'unified', 'memory', 'RAM', '256GB', '1TB', '2tb', 'SSD', 'storage', '13-inch',
+               '14 inch', '16-Inch', '24 inch', '6.1"', '6.7-inch', 'inch', 'iPhone 16', 'iPhone SE', 'Pro', 'Max', 'with', ',', '\n']
+
+
+def legacy_extract_price_from_text(text):
+    if not text: return None
+    match = re.search(r'₹\s*([\d,]+(?:\.\d{2})?)', text)
+    if match:
+        price_str = match.group(1).replace(',', '')
+        try: return float(price_str)
+        except ValueError: return None
+    return None
+
+
+def legacy_parse_mac_specs(spec_string, product_base_name=""):
+    specs = {"chip": "N/A", "cpu_cores": 0, "gpu_cores": 0, "ram_gb": 0, "storage_tb": 0, "screen_size_inch": 0}
+    if not spec_string: spec_string = ""
+    chip_match = re.search(r'(Apple\sM\d\s?(?:Pro|Max|Ultra|Extreme)?\s?chip)', spec_string, re.IGNORECASE)
+    if chip_match: specs["chip"] = chip_match.group(1).strip()
+    else:
+        chip_match_simple = re.search(r'(M\d\s?(?:Pro|Max|Ultra|Extreme)?)', spec_string, re.IGNORECASE)
+        if chip_match_simple: specs["chip"] = f"Apple {chip_match_simple.group(1).strip()} chip"
+    cpu_match = re.search(r'(\d+)-core\sCPU', spec_string, re.IGNORECASE)
+    if cpu_match: specs["cpu_cores"] = int(cpu_match.group(1))
+    gpu_match = re.search(r'(\d+)-core\sGPU', spec_string, re.IGNORECASE)
+    if gpu_match: specs["gpu_cores"] = int(gpu_match.group(1))
+    ram_match = re.search(r'(\d+)GB\s(?:unified\s)?memory', spec_string, re.IGNORECASE)
+    if not ram_match: ram_match = re.search(r'(\d+)GB\sRAM', spec_string, re.IGNORECASE)
+    if ram_match: specs["ram_gb"] = int(ram_match.group(1).replace('GB', ''))
+    storage_match_gb = re.search(r'(\d+)GB\sSSD', spec_string, re.IGNORECASE)
+    storage_match_tb = re.search(r'(\d+)TB\sSSD', spec_string, re.IGNORECASE)
+    if storage_match_tb: specs["storage_tb"] = int(storage_match_tb.group(1))
+    elif storage_match_gb: specs["storage_tb"] = int(storage_match_gb.group(1)) / 1000
+    screen_size_text = product_base_name + " " + spec_string
+    screen_match = re.search(r'(\d{2})-inch', screen_size_text, re.IGNORECASE)
+    if screen_match: specs["screen_size_inch"] = int(screen_match.group(1))
+    else:
+        for size in ["13", "14", "15", "16", "24", "27"]:
+            if f"{size} inch" in screen_size_text.lower() or f"{size}-inch" in product_base_name.lower():
+                specs["screen_size_inch"] = int(size)
+                break
+    return specs
+
+
+def legacy_parse_iphone_specs_from_name(name_from_url):
+    specs = {"chip": "N/A", "storage_tb": 0, "screen_size_inch": 0.0, "cpu_cores": 0, "gpu_cores": 0, "ram_gb": 0}
+    screen_match = re.search(r'(\d+\.?\d*)\s*(?:inch|")', name_from_url, re.IGNORECASE)
+    if screen_match: specs["screen_size_inch"] = float(screen_match.group(1))
+    storage_match_gb = re.search(r'(\d+)GB', name_from_url, re.IGNORECASE)
+    storage_match_tb = re.search(r'(\d+)TB', name_from_url, re.IGNORECASE)
+    if storage_match_tb: specs["storage_tb"] = int(storage_match_tb.group(1))
+    elif storage_match_gb: specs["storage_tb"] = int(storage_match_gb.group(1)) / 1000
+    if "iPhone SE" in name_from_url: specs["chip"] = "A-series Bionic (SE)"
+    elif "Pro" in name_from_url or "Max" in name_from_url: specs["chip"] = "A-series Bionic Pro/Max (latest)"
+    elif re.search(r'iPhone\s\d+', name_from_url): specs["chip"] = "A-series Bionic (latest)"
+    return specs
+
+
+def spec_summary(product):
+    # Rebuilds the kind of configuration summary the store shows for a tile
+    storage = product["storage_tb"]
+    storage_text = f"{int(storage)}TB SSD" if storage >= 1 else f"{round(storage * 1000)}GB SSD"
+    return (f"{product['chip']} with {product['cpu_cores']}-core CPU, {product['gpu_cores']}-core GPU, "
+            f"{product['ram_gb']}GB unified memory {storage_text} storage")
+
+
+def build_cases():
+    with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
+        products = json.load(f)
+    with open(TEST_PRODUCTS_FILE, 'r', encoding='utf-8') as f:
+        test_products = json.load(f)["products"]
+    with open(SNAPSHOT_FILE, 'rb') as f:
+        page = extract_mac_page(f.read())
+
+    mac_cases, iphone_cases = [], []
+    for product in products:
+        if product["category"] == "iPhone":
+            iphone_cases.append(product["name"])
+        else:
+            mac_cases.append((spec_summary(product), product["name"]))
+            mac_cases.append((product["name"], product["base_model_name"]))
+            mac_cases.append((page["text"], product["base_model_name"]))
+    for product in test_products:
+        mac_cases.append((product["name"], product["name"]))
+    rng = random.Random(42)
+    for _ in range(FUZZ_CASES):
+        text = ' '.join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(0, 12)))
+        base = ' '.join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(0, 3)))
+        mac_cases.append((text, base))
+        iphone_cases.append(text)
+    price_cases = [page["price_string"], page["price_text"], None, '', '₹1,99,900.00', 'From ₹ 59,900 or ₹4,992/mo.']
+    return products, mac_cases, iphone_cases, price_cases
+
+
+def golden_check(products, mac_cases, iphone_cases, price_cases):
+    failures = 0
+    for spec_string, base in mac_cases:
+        if specs.parse_mac_specs(spec_string, base) != legacy_parse_mac_specs(spec_string, base):
+            failures += 1
+            print(f"  mac mismatch: {spec_string[:80]!r} / {base!r}")
+    for name in iphone_cases:
+        if specs.parse_iphone_specs_from_name(name) != legacy_parse_iphone_specs_from_name(name):
+            failures += 1
+            print(f"  iphone mismatch: {name!r}")
+    for text in price_cases:
+        if specs.extract_price_from_text(text) != legacy_extract_price_from_text(text):
+            failures += 1
+            print(f"  price mismatch: {text!r}")
+    # The spec fields stored for every iPhone follow from its name alone
+    fields = ("chip", "storage_tb", "cpu_cores", "gpu_cores", "ram_gb")
+    for product in products:
+        if product["category"] == "iPhone":
+            parsed = specs.parse_iphone_specs_from_name(product["name"])
+            if any(parsed[k] != product[k] for k in fields):
+                failures += 1
+                print(f"  {PRODUCTS_FILE} mismatch: {product['name']}")
+    return failures
+
+
+def time_calls(func, cases, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for case in cases:
+            func(*case)
+    return (time.perf_counter() - started) / (rounds * len(cases)) * 1e6
+
+
+def main(rounds=5):
+    products, mac_cases, iphone_cases, price_cases = build_cases()
+    failures = golden_check(products, mac_cases, iphone_cases, price_cases)
+    print(f"Golden check: {len(mac_cases)} Mac, {len(iphone_cases)} iPhone, {len(price_cases)} price cases, {failures} mismatch(es)")
+
+    # Cold: memo cleared before every round, so the numbers reflect the scan itself
+    short_cases = [case for case in mac_cases if len(case[0]) < 1000]
+    legacy = time_calls(legacy_parse_mac_specs, short_cases, rounds)
+    cold = 0
+    for _ in range(rounds):
+        specs._mac_specs.cache_clear()
+        cold += time_calls(specs.parse_mac_specs, short_cases, 1) / rounds
+    warm = time_calls(specs.parse_mac_specs, short_cases, rounds)
+    print(f"parse_mac_specs: legacy {legacy:.1f} us/call, single-pass {cold:.1f} us/call ({legacy / cold:.2f}x), "
+          f"memoized {warm:.1f} us/call ({legacy / warm:.0f}x)")
+    iphone_cases = [(name,) for name in iphone_cases]
+    legacy = time_calls(legacy_parse_iphone_specs_from_name, iphone_cases, rounds)
+    warm = time_calls(specs.parse_iphone_specs_from_name, iphone_cases, rounds)
+    print(f"parse_iphone_specs_from_name: legacy {legacy:.1f} us/call, memoized {warm:.1f} us/call ({legacy / warm:.0f}x)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
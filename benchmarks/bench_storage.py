@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_catalogue import synthetic_products
+from catalogue import Catalogue
+from catalogue_store import ColumnarCatalogue, is_current, write_columnar
+
+# Load time and resident memory of the JSON catalogue versus the memory-mapped columnar file, with
+# and without building the price/facet indexes on top. Each load runs in a fresh interpreter so RSS
+# is not polluted by earlier runs. Run from the repository root: python -m benchmarks.bench_storage
+SIZES = (10_000, 100_000)
+
+
+def rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource  # Peak rather than current RSS, but still comparable between formats
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def stored_products(count):
+    # The bench_catalogue rows plus the long, highly repeated strings real products carry
+    products = synthetic_products(count)
+    for i, product in enumerate(products):
+        product["base_model_name"] = product["category"]
+        product["url"] = f"https://www.apple.com/in/shop/buy-mac/{product['category'].lower().replace(' ', '-')}/{i % 40}"
+        product["scraped_at"] = f"2025-05-06T19:10:{i % 60:02d}.000000"
+    return products
+
+
+def child(kind, path, build):
+    before = rss_kb()
+    started = time.perf_counter()
+    if kind == 'json':
+        with open(path, 'r', encoding='utf-8') as f:
+            products = json.load(f)
+    else:
+        products = ColumnarCatalogue(path)
+    catalogue = Catalogue(products) if build else None
+    elapsed = time.perf_counter() - started
+    if catalogue is not None:
+        catalogue.find_under_budget(150_000)
+    print(json.dumps({"seconds": elapsed, "rss_kb": rss_kb() - before}))
+
+
+def measure(kind, path, build):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_storage', '--child', kind, path, str(int(build))],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in SIZES:
+            products = stored_products(size)
+            json_path = os.path.join(tmp, f'{size}.json')
+            columnar_path = os.path.join(tmp, f'{size}.avfc')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(products, f, indent=4, ensure_ascii=False)
+            write_columnar(products, columnar_path, json_path)
+            if not is_current(columnar_path, json_path):
+                print(f"{size:>7} products: columnar file does not match the JSON it was built from")
+                return 1
+
+            roundtrip = ColumnarCatalogue(columnar_path)
+            same = [dict(p) for p in roundtrip] == products
+            roundtrip.close()
+            print(f"{size:>7} products: json {os.path.getsize(json_path) / 1e6:6.1f} MB | columnar {os.path.getsize(columnar_path) / 1e6:6.1f} MB | "
+                  f"{'round-trips exactly' if same else 'ROUND TRIP DIFFERS'}")
+            if not same:
+                return 1
+            for build in (False, True):
+                label = "load + indexes" if build else "load"
+                row = []
+                for kind, path in (('json', json_path), ('columnar', columnar_path)):
+                    result = measure(kind, path, build)
+                    row.append(f"{kind} {result['seconds'] * 1000:8.1f} ms {result['rss_kb'] / 1024:7.1f} MB RSS")
+                print(f"{'':>7}   {label:<15} " + " | ".join(row))
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3], sys.argv[4] == '1')
+        sys.exit(0)
+    sys.exit(main())
@@ -0,0 +1,272 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from scoring import SPEC_FIELDS, ValueScorer
+
+DEFAULT_RESULT_LIMIT = 5
+DEFAULT_PRICE_FIELD = 'price_inr'  # Regional catalogues use their own, e.g. price_usd (see regions.py)
+# Products can be narrowed by these fields; every value (and category/chip pair) gets its own index
+FACET_FIELDS = ('category', 'chip')
+# Spec search (SpecIndex): fields it takes min/max ranges on, "price" meaning the catalogue's price field
+RANGE_FIELDS = SPEC_FIELDS + ('price',)
+SORT_FIELDS = RANGE_FIELDS + ('value',)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+LADDER_PAGE_SIZE = 50   # Ladder products per page, the first of which is inlined into the index page
+
+
+class PriceIndex:
+    # Parallel, price-sorted tuples: prices[i] is the price of products[i]. Ties keep catalogue order.
+    __slots__ = ('prices', 'products', 'priced_count', 'price_field', '_scorer', '_spec_index')
+
+    def __init__(self, products, price_field=DEFAULT_PRICE_FIELD):
+        # Each price is read once: products may be row views over a columnar file rather than dicts
+        products = tuple(products)
+        self.price_field = price_field
+        raw_prices = [p.get(price_field) for p in products]
+        prices = [float('inf') if price is None else price for price in raw_prices]  # Unpriced sort last
+        order = sorted(range(len(products)), key=prices.__getitem__)
+        self.products = tuple(products[i] for i in order)
+        self.prices = tuple(prices[i] for i in order)
+        self.priced_count = len(raw_prices) - raw_prices.count(None)
+        self._scorer = None
+        self._spec_index = None
+
+    def __len__(self):
+        return len(self.products)
+
+    @property
+    def scorer(self):
+        # Built on first use; rows share the index's price order
+        if self._scorer is None:
+            self._scorer = ValueScorer(self.products, self.price_field)
+        return self._scorer
+
+    @property
+    def spec_index(self):
+        if self._spec_index is None:
+            self._spec_index = SpecIndex(self)
+        return self._spec_index
+
+    def price_range(self, lo=None, hi=None):
+        # Rows [start, stop) priced within [lo, hi]; either bound may be None
+        start = 0 if lo is None else bisect_left(self.prices, lo, 0, self.priced_count)
+        stop = self.priced_count if hi is None else self.budget_bucket(hi)
+        return start, max(start, stop)
+
+    def budget_bucket(self, budget):
+        # Number of products affordable at `budget`. Answers only change when a budget crosses a
+        # price breakpoint, so every budget with the same bucket gets the same results.
+        if budget != budget: return 0  # NaN
+        return min(bisect_right(self.prices, budget), self.priced_count)
+
+    def under_budget(self, budget, limit=DEFAULT_RESULT_LIMIT):
+        # Most expensive products priced at or below `budget`, highest first, ties in catalogue order
+        hi = self.budget_bucket(budget)
+        if hi == 0 or limit <= 0: return []
+        lo = max(hi - limit, 0)
+        # Widen the window to the whole tie group at its lower edge so ties resolve like a stable sort
+        lo = bisect_left(self.prices, self.prices[lo], 0, lo)
+        window = sorted(range(lo, hi), key=lambda i: -self.prices[i])
+        return [self.products[i] for i in window[:limit]]
+
+    def best_value_under_budget(self, budget, limit=DEFAULT_RESULT_LIMIT, weights=None):
+        # Rows share the index's price order, so "within budget" is just a prefix of the score columns
+        return self.scorer.top_k(limit, weights, stop=self.budget_bucket(budget))
+
+
+def _bitset(flags):
+    # Boolean row array -> int with bit i set for row i
+    return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+
+def _spec_number(value):
+    # Spec parsers write 0 when they couldn't read a spec, so only positive numbers count as known
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value < float('inf'):
+        return np.nan
+    return value
+
+
+def facet_key(value):
+    # Facet values are matched ignoring case and whitespace ("Apple M4\xa0chip" == "apple m4 chip")
+    return ' '.join(value.split()).casefold()
+
+
+class SpecIndex:
+    # Filter index over a PriceIndex's rows, built once per catalogue. A set of rows is a Python int
+    # used as a bitset (bit i = row i, rows in price order), so criteria combine with `&` on a few
+    # machine words per 64 products:
+    #   - spec ranges: each field's distinct values, sorted, with at_least[j] = rows whose value is >=
+    #     values[j]; min/max become two bisects and at_least[lo] & ~at_least[hi]
+    #   - category/chip: one bitset per value
+    #   - price: rows are already price-sorted, so a price range is a run of consecutive bits
+    # Products missing a spec never match a range on it, and sort last when sorting by it.
+    def __init__(self, price_index):
+        self.price_index = price_index
+        self.size = len(price_index)
+        self.all_rows = (1 << self.size) - 1
+        self.columns = {field: np.array([_spec_number(p.get(field)) for p in price_index.products], dtype=np.float64)
+                        for field in SPEC_FIELDS}
+        self.columns['price'] = np.array([_spec_number(price) for price in price_index.prices], dtype=np.float64)
+        self.values, self.at_least = {}, {}
+        for field in SPEC_FIELDS:
+            column = self.columns[field]
+            values = np.unique(column[~np.isnan(column)])
+            self.values[field] = values.tolist()
+            self.at_least[field] = [_bitset(column >= value) for value in values] + [0]
+        self.facets = {}
+        for field in FACET_FIELDS:
+            rows = {}
+            for i, product in enumerate(price_index.products):
+                value = product.get(field)
+                if isinstance(value, str):
+                    rows.setdefault(facet_key(value), []).append(i)
+            bitsets = self.facets[field] = {}
+            for value, members in rows.items():
+                flags = np.zeros(self.size, dtype=bool)
+                flags[members] = True
+                bitsets[value] = _bitset(flags)
+        self.orders = {}
+
+    def normalize(self, ranges=None, facets=None):
+        # Criteria -> a hashable key naming exactly the rows they match: ranges become index bounds,
+        # so e.g. min_ram_gb=12 and min_ram_gb=16 are the same query when no product has 12-15 GB.
+        # ranges: {field: (min or None, max or None)}; facets: {field: [accepted values]}
+        key = []
+        for field, (lo, hi) in sorted((ranges or {}).items()):
+            if field == 'price':
+                key.append((field,) + self.price_index.price_range(lo, hi))
+                continue
+            values = self.values[field]
+            start = 0 if lo is None else bisect_left(values, lo)
+            stop = len(values) if hi is None else bisect_right(values, hi)
+            key.append((field, start, max(start, stop)))
+        for field, accepted in sorted((facets or {}).items()):
+            key.append((field, tuple(sorted({facet_key(value) for value in accepted}))))
+        return tuple(key)
+
+    def rows(self, key):
+        # Bitset of the rows matching a normalize() key
+        rows = self.all_rows
+        for field, *bounds in key:
+            if field == 'price':
+                start, stop = bounds
+                rows &= ((1 << stop) - 1) ^ ((1 << start) - 1)
+            elif field in self.facets:
+                accepted = 0
+                for value in bounds[0]:
+                    accepted |= self.facets[field].get(value, 0)
+                rows &= accepted
+            else:
+                start, stop = bounds
+                at_least = self.at_least[field]
+                rows &= at_least[start] & ~at_least[stop]
+        return rows
+
+    def _order(self, field, descending):
+        # Every row sorted by `field` (rows missing it last), ties cheapest first; built once per sort
+        if (field, descending) not in self.orders:
+            column = self.columns[field]
+            missing = np.isnan(column)
+            values = np.where(missing, 0, -column if descending else column)
+            self.orders[field, descending] = np.lexsort((np.arange(self.size), values, missing))
+        return self.orders[field, descending]
+
+    def search(self, key, sort='price', descending=False, offset=0, limit=DEFAULT_PAGE_SIZE, weights=None):
+        # Returns (total matches, the page of products). sort='value' ranks by value score, best first,
+        # whatever `descending` says.
+        rows = self.rows(key)
+        total = rows.bit_count()
+        if total == 0 or limit <= 0 or offset >= total:
+            return total, []
+        matched = np.unpackbits(np.frombuffer(rows.to_bytes((self.size + 7) // 8, 'little'), dtype=np.uint8),
+                                bitorder='little', count=self.size).view(bool)
+        if sort == 'value':
+            members = np.flatnonzero(matched)
+            scores = self.price_index.scorer.scores(weights)[members]
+            wanted = offset + limit
+            if wanted < members.size:
+                # Only the top of the ranking is sorted: everything scoring at least the wanted-th best
+                # score, so a tie group straddling the page edge still pages consistently
+                cutoff = -np.partition(-scores, wanted - 1)[wanted - 1]
+                members, scores = members[scores >= cutoff], scores[scores >= cutoff]
+            order = members[np.lexsort((members, -scores))]
+        else:
+            order = self._order(sort, descending)
+            order = order[matched[order]]
+        return total, [self.price_index.products[i] for i in order[offset:offset + limit]]
+
+
+class Catalogue:
+    def __init__(self, products, version=None, price_field=DEFAULT_PRICE_FIELD):
+        # version identifies the data on disk, so every worker serving the same file agrees on it
+        self.version = version
+        self.price_field = price_field
+        self.products = tuple(products)
+        self.price_index = PriceIndex(self.products, price_field)
+        self.facet_indexes = self._build_facet_indexes()
+
+    def _build_facet_indexes(self):
+        groups = {}
+        for product in self.price_index.products:
+            values = tuple(product.get(field) for field in FACET_FIELDS)
+            for mask in range(1, 2 ** len(FACET_FIELDS)):
+                if any(mask & (1 << i) and value is None for i, value in enumerate(values)):
+                    continue
+                key = tuple(value if mask & (1 << i) else None for i, value in enumerate(values))
+                groups.setdefault(key, []).append(product)
+        return {key: PriceIndex(group, self.price_field) for key, group in groups.items()}
+
+    def __len__(self):
+        return len(self.products)
+
+    @property
+    def ladder(self):
+        # Every product, cheapest first; unpriced products sort last
+        return self.price_index.products
+
+    def ladder_start(self, cursor=None):
+        # Row of the ladder a cursor from ladder_cursor() resumes at; raises ValueError if malformed
+        if not cursor:
+            return 0
+        price, _, sent = cursor.partition(':')
+        price, sent = float(price), int(sent)
+        if price != price or sent < 0:
+            raise ValueError(f"Invalid cursor '{cursor}'")
+        prices = self.price_index.prices
+        return min(bisect_left(prices, price) + sent, len(prices))
+
+    def ladder_cursor(self, stop):
+        # Cursor for the ladder from row `stop` on, or None at the end: the last price sent and how
+        # many products at that price were sent. Unlike a row number it still points at the same
+        # place after a reload adds or drops cheaper products.
+        prices = self.price_index.prices
+        if not 0 < stop < len(prices):
+            return None
+        return f"{prices[stop - 1]!r}:{stop - bisect_left(prices, prices[stop - 1])}"
+
+    def _index_for(self, facets):
+        key = tuple(facets.get(field) for field in FACET_FIELDS)
+        if not any(value is not None for value in key):
+            return self.price_index
+        return self.facet_indexes.get(key)
+
+    def budget_bucket(self, budget, **facets):
+        index = self._index_for(facets)
+        return index.budget_bucket(budget) if index else 0
+
+    def find_under_budget(self, budget, limit=DEFAULT_RESULT_LIMIT, **facets):
+        index = self._index_for(facets)
+        return index.under_budget(budget, limit) if index else []
+
+    def find_best_value(self, budget, limit=DEFAULT_RESULT_LIMIT, weights=None, **facets):
+        index = self._index_for(facets)
+        return index.best_value_under_budget(budget, limit, weights) if index else []
+
+    def search_key(self, ranges=None, facets=None):
+        return self.price_index.spec_index.normalize(ranges, facets)
+
+    def search(self, key, sort='price', descending=False, offset=0, limit=DEFAULT_PAGE_SIZE, weights=None):
+        # Multi-criteria spec search; `key` comes from search_key(). Returns (total matches, page).
+        return self.price_index.spec_index.search(key, sort, descending, offset, limit, weights)
@@ -0,0 +1,339 @@
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+# Columnar, memory-mapped catalogue file. Layout (little-endian, every block 8-byte aligned):
+#   MAGIC | column blocks | string offsets (u64) | string data (utf-8) | header JSON | u64 header offset | u32 header length | MAGIC
+# Numeric columns are raw int64/float64 arrays; string columns hold u32 ids into a single interned
+# string table, so a chip name shared by 10k products is stored once. Workers mmap the file read-only,
+# which lets the OS page cache hold one copy for all of them, and products are exposed as small row
+# views that read their fields out of the columns on demand.
+
+# --- Configuration ---
+MAGIC = b'AVFCAT01'
+COLUMNAR_FILE = 'apple_products.avfc'  # Written next to apple_products.json, which stays as the export format
+MISSING_ID = 0xFFFFFFFF                # String id for "product has no such key"
+NULL_ID = 0xFFFFFFFE                   # String id for None in string columns
+ALIGN = 8
+WRITE_CHUNK_ROWS = 10000               # Rows converted and written at a time by write_columnar
+TRAILER = struct.Struct('<QI8s')
+
+# Column types: 'i' int64, 'f' float64 (NaN = missing), 's' interned string, 'j' any other JSON value, interned.
+# Float columns that also hold ints (e.g. storage_tb 1 and 0.5) carry a u8 flag per row so exports keep the int.
+TYPECODES = {'i': 'q', 'f': 'd', 's': 'I', 'j': 'I'}
+
+
+class _Missing:
+    __slots__ = ()
+
+
+_MISSING = _Missing()
+
+
+class _ColumnKind:
+    # Picks a column's type from its values, seen one at a time
+    __slots__ = ('present', 'numeric', 'ints', 'text', 'has_int')
+
+    def __init__(self):
+        self.present, self.numeric, self.ints, self.text, self.has_int = 0, True, True, True, False
+
+    def add(self, value):
+        kind = type(value)
+        self.present += 1
+        self.numeric = self.numeric and kind in (int, float)
+        self.ints = self.ints and kind is int and -2 ** 63 <= value < 2 ** 63
+        self.text = self.text and (value is None or kind is str)
+        self.has_int = self.has_int or kind is int
+
+    def kind(self, rows):
+        if self.ints and self.present == rows:
+            return 'i'
+        if self.numeric and self.present:
+            return 'f'
+        if self.text:
+            return 's'
+        return 'j'
+
+
+def _write_aligned(f, data):
+    f.write(data)
+    f.write(b'\0' * (-f.tell() % ALIGN))
+
+
+def _little_endian(data):
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def source_stamp(path):
+    # Size and mtime of the JSON file a columnar file was built from. os.replace keeps both, so the
+    # stamp taken from the scraper's temp file still matches once it is renamed into place.
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_columnar(products, path=COLUMNAR_FILE, source=None):
+    # products: a list of product dicts, or a function returning a fresh iterator over them. The
+    # file is written in two passes, types and layout first, then WRITE_CHUNK_ROWS rows at a time
+    # into their column blocks, so a catalogue streamed from disk is never held whole.
+    # source: the JSON file the products came from; its stamp goes into the header (see is_built_from)
+    if not callable(products):
+        products = list(products)
+        rows_of = lambda: iter(products)
+    else:
+        rows_of = products
+    kinds = {}        # name -> _ColumnKind, in first-seen order
+    key_orders = {}   # Each distinct key order (Mac rows and iPhone rows differ) is kept once, so exports match the input
+    rows = 0
+    for product in rows_of():
+        for name, value in product.items():
+            kind = kinds.get(name)
+            if kind is None:
+                kind = kinds[name] = _ColumnKind()
+            kind.add(value)
+        key_orders.setdefault(tuple(product), len(key_orders))
+        rows += 1
+
+    header = {"rows": rows, "columns": [], "key_orders": [list(order) for order in key_orders],
+              "source": source_stamp(source) if source else None}
+    offset = len(MAGIC) + -len(MAGIC) % ALIGN
+
+    def block(size):
+        nonlocal offset
+        start = offset
+        offset += size + -size % ALIGN
+        return start
+
+    for name, kind in kinds.items():
+        column = {"name": name, "type": kind.kind(rows)}
+        column["offset"] = block(array(TYPECODES[column["type"]]).itemsize * rows)
+        if column["type"] == 'f' and kind.has_int:
+            column["int_flags"] = block(rows)
+        header["columns"].append(column)
+    header["key_order_ids"] = block(4 * rows)
+    strings_offset = offset
+    strings = {}  # text -> id, in insertion order
+
+    def intern(text):
+        return strings.setdefault(text, len(strings))
+
+    def column_data(kind, values):
+        if kind == 'i':
+            return array('q', values)
+        if kind == 'f':
+            return array('d', (float('nan') if v is _MISSING or v is None else v for v in values))
+        if kind == 's':
+            return array('I', (MISSING_ID if v is _MISSING else NULL_ID if v is None else intern(v) for v in values))
+        return array('I', (MISSING_ID if v is _MISSING else intern(json.dumps(v, ensure_ascii=False)) for v in values))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        written, stream = 0, rows_of()
+        while True:
+            chunk = list(itertools.islice(stream, WRITE_CHUNK_ROWS))
+            if not chunk:
+                break
+            if written + len(chunk) > rows:
+                raise ValueError("products changed between the two passes of write_columnar")
+            for column in header["columns"]:
+                values = [product.get(column["name"], _MISSING) for product in chunk]
+                data = column_data(column["type"], values)
+                f.seek(column["offset"] + data.itemsize * written)
+                f.write(_little_endian(data))
+                if "int_flags" in column:
+                    f.seek(column["int_flags"] + written)
+                    f.write(bytes(type(v) is int for v in values))
+            f.seek(header["key_order_ids"] + 4 * written)
+            f.write(_little_endian(array('I', (key_orders[tuple(product)] for product in chunk))))
+            written += len(chunk)
+        if written != rows:
+            raise ValueError("products changed between the two passes of write_columnar")
+
+        f.seek(strings_offset)
+        encoded = [text.encode('utf-8') for text in strings]
+        offsets = array('Q', [0])
+        for raw in encoded:
+            offsets.append(offsets[-1] + len(raw))
+        header["strings"] = {"count": len(encoded), "offsets": f.tell(), "size": offsets[-1]}
+        _write_aligned(f, _little_endian(offsets))
+        header["strings"]["data"] = f.tell()
+        _write_aligned(f, b''.join(encoded))
+
+        header_offset = f.tell()
+        header_bytes = json.dumps(header).encode('utf-8')
+        f.write(header_bytes)
+        f.write(TRAILER.pack(header_offset, len(header_bytes), MAGIC))
+    os.replace(tmp_path, path)
+    return path
+
+
+class ColumnarCatalogue:
+    # Read-only view over a memory-mapped catalogue file; indexable like a list of products
+    def __init__(self, path=COLUMNAR_FILE):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < len(MAGIC) + TRAILER.size or self.buffer[:len(MAGIC)] != MAGIC:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a columnar catalogue file")
+        self.views = []  # Every view into the map, released by close()
+        self.columns = {}
+        try:
+            header_offset, header_size, magic = TRAILER.unpack_from(self.buffer, len(self.buffer) - TRAILER.size)
+            if magic != MAGIC:
+                raise ValueError("trailer is missing; the file is truncated")
+            header = json.loads(self.buffer[header_offset:header_offset + header_size])
+            self.rows = header["rows"]
+            self.source = header.get("source")
+            for column in header["columns"]:
+                typecode = TYPECODES[column["type"]]
+                values = self._view(column["offset"], array(typecode).itemsize * self.rows, typecode)
+                int_flags = self._view(column["int_flags"], self.rows) if "int_flags" in column else None
+                self.columns[column["name"]] = (column["type"], values, int_flags)
+            self.key_orders = [tuple(order) for order in header["key_orders"]]
+            self.key_order_ids = self._view(header["key_order_ids"], 4 * self.rows, 'I')
+            strings = header["strings"]
+            self.string_offsets = self._view(strings["offsets"], 8 * (strings["count"] + 1), 'Q')
+            self.string_data = self._view(strings["data"], strings["size"])
+        except (ValueError, KeyError, TypeError, IndexError, AttributeError, struct.error) as e:
+            # A damaged header must read as "no usable columnar file", never crash the caller
+            self.close()
+            raise ValueError(f"{path} is damaged: {e!r}")
+        self.string_cache = {}
+
+    def _view(self, start, size, typecode=None):
+        if not 0 <= start <= start + size <= len(self.buffer):
+            raise ValueError(f"block {start}+{size} is outside the file")
+        view = memoryview(self.buffer)[start:start + size]
+        if typecode is not None:
+            view = view.cast(typecode)
+        self.views.append(view)
+        return view
+
+    def is_built_from(self, path):
+        # True when the header's stamp matches `path` as it is on disk now, i.e. this file holds the
+        # same catalogue; mtimes can't tell, since the scraper writes the columnar file first
+        try:
+            return self.source is not None and self.source == source_stamp(path)
+        except OSError:
+            return False
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if not -self.rows <= row < self.rows:
+            raise IndexError(row)
+        return ProductRecord(self, row % self.rows)
+
+    def __iter__(self):
+        return (ProductRecord(self, row) for row in range(self.rows))
+
+    def column(self, name):
+        # Zero-copy typed view of a numeric column (e.g. for numpy.frombuffer)
+        kind, values, _ = self.columns[name]
+        if kind not in ('i', 'f'):
+            raise TypeError(f"Column '{name}' is not numeric")
+        return values
+
+    def string(self, string_id):
+        text = self.string_cache.get(string_id)
+        if text is None:
+            text = str(self.string_data[self.string_offsets[string_id]:self.string_offsets[string_id + 1]], 'utf-8')
+            self.string_cache[string_id] = text
+        return text
+
+    def value(self, name, row):
+        # Returns _MISSING when the product has no such key
+        kind, values, int_flags = self.columns[name]
+        raw = values[row]
+        if kind == 'i':
+            return raw
+        if kind == 'f':
+            if raw != raw:
+                return _MISSING
+            return int(raw) if int_flags is not None and int_flags[row] else raw
+        if raw == MISSING_ID:
+            return _MISSING
+        if kind == 's':
+            return None if raw == NULL_ID else self.string(raw)
+        return json.loads(self.string(raw))
+
+    def close(self):
+        # Views into the map must be released before it can be unmapped
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.columns = {}
+        self.buffer.close()
+
+
+def is_current(path, source):
+    # True when the columnar file at `path` exists, is readable and was built from `source` as it is now
+    try:
+        store = ColumnarCatalogue(path)
+    except (OSError, ValueError):
+        return False
+    try:
+        return store.is_built_from(source)
+    finally:
+        store.close()
+
+
+class ProductRecord(Mapping):
+    # One catalogue row, read lazily from the columns; dict(record) gives the plain product dict
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        # Hot path for the index builders, which read every product's price and facets
+        if key not in self._store.columns:
+            return default
+        value = self._store.value(key, self._row)
+        return default if value is _MISSING else value
+
+    def _keys(self):
+        return self._store.key_orders[self._store.key_order_ids[self._row]]
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __repr__(self):
+        return f"ProductRecord({dict(self)!r})"
+
+
+def export_json(catalogue, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([dict(product) for product in catalogue], f, indent=4, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    # python catalogue_store.py build apple_products.json [apple_products.avfc]
+    # python catalogue_store.py export apple_products.avfc out.json
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build', 'export'):
+        print("usage: python catalogue_store.py build <json> [<avfc>] | export <avfc> <json>")
+        sys.exit(2)
+    if sys.argv[1] == 'build':
+        with open(sys.argv[2], 'r', encoding='utf-8') as f:
+            print(f"Wrote {write_columnar(json.load(f), sys.argv[3] if len(sys.argv) > 3 else COLUMNAR_FILE, sys.argv[2])}")
+    else:
+        export_json(ColumnarCatalogue(sys.argv[2]), sys.argv[3])
+        print(f"Wrote {sys.argv[3]}")
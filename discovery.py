@@ -0,0 +1,221 @@
+import html
+import json
+import math
+import os
+import re
+from datetime import datetime
+
+import metrics
+from specs import parse_iphone_specs_from_name, parse_mac_specs
+
+# Apple's buy pages embed every configuration they sell as JSON: the page's own data slots
+# (window.pageLevelData.productSelectionTabSlots.*, one per size tab, with chip, cores, memory,
+# storage and price per part number), a schema.org Product with one Offer per part number, and the
+# analytics "metrics" block with a name per part number. One fetch of a family page therefore
+# enumerates all of its sizes, storage tiers, chips and colours.
+
+# --- Configuration ---
+SKU_FILE = 'discovered_skus.json'   # Specs per part number, so known SKUs are never described twice
+DETAIL_URL = 'https://www.apple.com/in/shop/product/{part_number}'   # Rewritten per region
+# Screen sizes by model, for SKUs whose embedded name doesn't carry one (longest name wins)
+IPHONE_SCREEN_SIZES = {'iPhone 16 Pro Max': 6.9, 'iPhone 16 Pro': 6.3, 'iPhone 16 Plus': 6.7, 'iPhone 16': 6.1,
+                       'iPhone 15 Pro Max': 6.7, 'iPhone 15 Pro': 6.1, 'iPhone 15 Plus': 6.7, 'iPhone 15': 6.1}
+
+SLOT_PATTERN = re.compile(r'productSelectionTabSlots\.\w+\s*=\s*')
+LD_JSON_PATTERN = re.compile(r'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.DOTALL)
+METRICS_PATTERN = re.compile(r'<script[^>]*id="metrics"[^>]*>(.*?)</script>', re.DOTALL)
+HIDDEN_PATTERN = re.compile(r'<span class="visuallyhidden">.*?</span>|<sup>.*?</sup>', re.DOTALL)
+ALT_PATTERN = re.compile(r'<img[^>]*\balt="([^"]+)"')
+TAG_PATTERN = re.compile(r'<br\s*/?>|<[^>]+>')
+FOOTNOTE_MARKS = str.maketrans('', '', '¹²³⁴⁵⁶⁷⁸⁹⁰*†‡§')
+
+SKUS_SEEN = metrics.counter('scraper_discovered_skus_total', 'Part numbers found on buy pages, by whether they were already known',
+                            ('region', 'status'))
+
+
+def _text(fragment):
+    # "<div><img alt="Apple M4 Chip"></div>10-Core CPU<br />24GB Unified Memory" -> "Apple M4 Chip, 10-Core CPU, 24GB Unified Memory"
+    fragment = HIDDEN_PATTERN.sub('', fragment or '')
+    parts = ALT_PATTERN.findall(fragment) + TAG_PATTERN.sub('\n', fragment).split('\n')
+    parts = [' '.join(html.unescape(part).replace('\xa0', ' ').translate(FOOTNOTE_MARKS).split()) for part in parts]
+    return ', '.join(part for part in parts if part)
+
+
+def _json_blocks(pattern, text):
+    for match in pattern.finditer(text):
+        try:
+            yield json.loads(match.group(1))
+        except ValueError:
+            continue
+
+
+def _slot_configurations(text):
+    # Mac buy pages: one data slot per size tab, one modelType entry per part number
+    decoder = json.JSONDecoder()
+    for match in SLOT_PATTERN.finditer(text):
+        try:
+            slot, _ = decoder.raw_decode(text, match.end())
+            group = slot["productSelectionGroup"]
+            family = _text(slot.get("displayMetadata", {}).get("productTitle")).replace('″', '-inch')
+            for colour_group in group["groups"]["items"]:
+                for item in colour_group["value"]["modelType"]["items"]:
+                    model = item["value"]
+                    purchase = model.get("modelTypePurchase") or {}
+                    part_number = purchase.get("partNumber") or model.get("favorites", {}).get("partNumber")
+                    price = ((purchase.get("financing") or {}).get("price") or {}).get("taxInclusivePrice")
+                    header = _text(model.get("columnHeader")) or _text(model.get("modelTitle"))
+                    details = ', '.join(_text(detail["value"]) for detail in model.get("modelTypeDetails", {}).get("items", []))
+                    if part_number:
+                        yield {"part_number": part_number, "family": family, "name": f"{family} - {header}",
+                               "price": price, "spec_text": f"{header}, {details}"}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            continue
+
+
+def _offer_configurations(text, currency):
+    # Any buy page: part number and price from the schema.org offers, name from the metrics block
+    prices, family = {}, None
+    for block in _json_blocks(LD_JSON_PATTERN, text):
+        for product in block if isinstance(block, list) else [block]:
+            if not isinstance(product, dict) or product.get("@type") != "Product":
+                continue
+            family = family or _text(product.get("name"))
+            offers = product.get("offers") or []
+            for offer in offers if isinstance(offers, list) else [offers]:
+                if isinstance(offer, dict) and offer.get("sku") and offer.get("priceCurrency", currency) == currency:
+                    prices.setdefault(offer["sku"], offer.get("price"))
+    names = {}
+    for block in _json_blocks(METRICS_PATTERN, text):
+        for product in (block.get("data") or {}).get("products") or []:
+            if isinstance(product, dict) and product.get("partNumber"):
+                names.setdefault(product["partNumber"], _text(product.get("name")))
+                if product["partNumber"] not in prices and (product.get("price") or {}).get("fullPrice"):
+                    prices[product["partNumber"]] = product["price"]["fullPrice"]
+    for part_number, price in prices.items():
+        name = names.get(part_number) or family or part_number
+        yield {"part_number": part_number, "family": family or name, "name": name, "price": price, "spec_text": name}
+
+
+def extract_configurations(content, currency):
+    # Every configuration embedded in a buy page, deduplicated by part number; [] when the page
+    # embeds nothing (the scraper then falls back to other pages or the rendered tiles). Prices become
+    # floats; a configuration whose price is missing or unreadable is left out.
+    text = content.decode('utf-8', errors='replace') if isinstance(content, bytes) else content
+    configurations = {}
+    for source in (_slot_configurations(text), _offer_configurations(text, currency)):
+        for config in source:
+            known = configurations.get(config["part_number"])
+            if known is None:
+                configurations[config["part_number"]] = config
+            elif known["price"] is None:
+                known["price"] = config["price"]
+    usable = []
+    for config in configurations.values():
+        if config["price"] is None:
+            continue
+        try:
+            price = float(str(config["price"]).replace(',', ''))
+        except ValueError:
+            price = None
+        if price is None or not math.isfinite(price):
+            print(f"  Skipping {config['part_number']}: unreadable price {config['price']!r}")
+            continue
+        config["price"] = price
+        usable.append(config)
+    return usable
+
+
+def describe(config, category, detail_title=None):
+    # Returns (specs, complete). `detail_title` is the title of the SKU's own product page, for
+    # SKUs whose embedded data leaves out specs the catalogue needs.
+    text = f"{config['spec_text']} {detail_title or ''}".strip()
+    if "iPhone" in category:
+        screen = next((size for model, size in sorted(IPHONE_SCREEN_SIZES.items(), key=lambda item: -len(item[0]))
+                       if model.lower() in text.lower()), None)
+        specs = parse_iphone_specs_from_name(f'{text} {screen}"' if screen and '"' not in text else text)
+        return specs, bool(specs["storage_tb"] and specs["screen_size_inch"])
+    specs = parse_mac_specs(text, config["family"])
+    # Image alt texts say "Apple M4 Chip"; keep the chip facet values the tiles always produced
+    specs["chip"] = re.sub(r'\bChip$', 'chip', specs["chip"])
+    return specs, bool(specs["chip"] != "N/A" and specs["ram_gb"] and specs["storage_tb"])
+
+
+def detail_url(part_number, region):
+    return region.url(DETAIL_URL.format(part_number=part_number))
+
+
+class SkuRegistry:
+    # Part number -> specs for every SKU ever described, saved per region. Prices come from the
+    # family page on every run; specs of a part number don't change, so a SKU is only described
+    # (and, if its embedded data is incomplete, fetched) the first time it shows up.
+    def __init__(self, path=SKU_FILE):
+        # path=None keeps the registry in memory only
+        self.path = path
+        self.skus = {}
+        self.dirty = False
+        if path is None:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.skus = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, part_number):
+        return self.skus.get(part_number)
+
+    def add(self, config, specs, complete):
+        self.skus[config["part_number"]] = {"name": config["name"], "specs": specs, "complete": complete,
+                                            "first_seen": self.skus.get(config["part_number"], {}).get("first_seen", datetime.now().isoformat())}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty or self.path is None:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.skus, f, indent=4, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def discover_products(configs, category, url, region, registry, fetch_details=None):
+    # Products for one family page. SKUs already in the registry reuse their specs; new ones are
+    # described from the embedded data, and those it can't fully describe are handed to
+    # fetch_details (part numbers -> {part number: page title}) in one batch; without it they keep
+    # what the embedded data gave and stay new for the next run. Colour variants with
+    # identical name, specs and price become one product listing all their part numbers.
+    described, incomplete, new_count = {}, [], 0
+    for config in configs:
+        known = registry.get(config["part_number"])
+        if known:
+            described[config["part_number"]] = known["specs"]
+            continue
+        new_count += 1
+        specs, complete = describe(config, category)
+        described[config["part_number"]] = specs
+        if complete:
+            registry.add(config, specs, True)
+        else:
+            incomplete.append(config)
+    SKUS_SEEN.inc(region.code, 'known', amount=len(configs) - new_count)
+    SKUS_SEEN.inc(region.code, 'new', amount=new_count)
+    if incomplete and fetch_details:
+        titles = fetch_details([config["part_number"] for config in incomplete])
+        for config in incomplete:
+            title = titles.get(config["part_number"])
+            specs, complete = describe(config, category, title)
+            if title is not None:
+                registry.add(config, specs, complete)  # As well described as it gets; not fetched again
+            described[config["part_number"]] = specs
+    products = {}
+    for config in configs:
+        specs = described[config["part_number"]]
+        key = (config["name"], tuple(specs.items()), config["price"])
+        if key in products:
+            products[key]["part_numbers"].append(config["part_number"])
+            continue
+        products[key] = {"name": config["name"], "category": category, "base_model_name": config["family"],
+                         region.price_field: config["price"], **specs, "part_numbers": [config["part_number"]],
+                         "url": url, "scraped_at": datetime.now().isoformat()}
+    return list(products.values())
@@ -0,0 +1,187 @@
+import copy
+import itertools
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# --- Configuration ---
+MAX_WORKERS = 8            # Threads fetching in parallel
+PER_HOST_LIMIT = 4         # Max in-flight requests against a single host
+RATE_PER_SECOND = 4.0      # Token bucket refill rate (requests/second, all hosts)
+RATE_BURST = 4             # Token bucket capacity
+MAX_RETRIES = 3            # Retries after the first attempt
+BACKOFF_BASE_SECONDS = 0.5 # Backoff grows as base * 2^attempt (+ jitter)
+REQUEST_TIMEOUT = 20       # Per-request timeout, capped by the remaining deadline
+TOTAL_DEADLINE = 180       # Budget for a whole fetch_all() call, in seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# not_modified is True when the server answered 304 and `content` came from the HTTP cache
+FetchResult = namedtuple('FetchResult', ['url', 'content', 'status', 'error', 'attempts', 'elapsed', 'not_modified'],
+                         defaults=[False])
+
+FETCH_SECONDS = metrics.histogram('scraper_fetch_duration_seconds', 'Time to fetch one page, retries included', ('outcome',),
+                                  metrics.SCRAPE_BUCKETS)
+FETCH_BYTES = metrics.counter('scraper_fetched_bytes_total', 'Page bytes downloaded (304 revalidations download none)')
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline_at=None):
+        # Blocks until a token is available; returns False if that would overrun the deadline
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline_at is not None and now + wait > deadline_at:
+                return False
+            time.sleep(wait)
+
+
+class FetchEngine:
+    def __init__(self, headers=None, session=None, max_workers=MAX_WORKERS, per_host_limit=PER_HOST_LIMIT,
+                 rate=RATE_PER_SECOND, burst=RATE_BURST, max_retries=MAX_RETRIES,
+                 backoff=BACKOFF_BASE_SECONDS, timeout=REQUEST_TIMEOUT, total_deadline=TOTAL_DEADLINE, cache=None):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.total_deadline = total_deadline
+        self.bucket = TokenBucket(rate, burst)
+        self.host_slots = {}
+        self.host_slots_lock = threading.Lock()
+        if session is None:
+            # One keep-alive session for every request; the pool is sized to the worker count
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        if headers:
+            session.headers.update(headers)
+        self.session = session
+
+    def with_cache(self, cache):
+        # An engine on the same session, rate limit and per-host slots, with its own cache
+        engine = copy.copy(self)
+        engine.cache = cache
+        return engine
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self.host_slots_lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self.host_slots[host]
+
+    def _backoff_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+
+    def fetch(self, url, deadline_at=None):
+        result = self._fetch(url, deadline_at)
+        outcome = 'error' if result.error else 'not_modified' if result.not_modified else 'ok'
+        FETCH_SECONDS.observe(result.elapsed, outcome)
+        if outcome == 'ok':
+            FETCH_BYTES.inc(amount=len(result.content))
+        return result
+
+    def _fetch(self, url, deadline_at=None):
+        if deadline_at is None:
+            deadline_at = time.monotonic() + self.total_deadline
+        started = time.monotonic()
+        error = None
+        status = None
+        attempt = 0
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0 or not self.bucket.acquire(deadline_at):
+                error = error or "deadline exceeded"
+                break
+            response = None
+            try:
+                conditional = self.cache.conditional_headers(url) if self.cache else {}
+                with self._host_slot(url):
+                    response = self.session.get(url, headers=conditional,
+                                                timeout=min(self.timeout, max(deadline_at - time.monotonic(), 0.1)))
+                status = response.status_code
+                if status == 304 and self.cache:
+                    content = self.cache.load(url)
+                    if content is not None:
+                        self.cache.record_hit(url, content)
+                        return FetchResult(url, content, status, None, attempt + 1, time.monotonic() - started, True)
+                    # Cached body vanished under us; drop the entry so the next attempt is unconditional
+                    self.cache.forget(url)
+                    error = "304 without a cached body"
+                elif status not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    if self.cache: self.cache.store(url, response.content, response.headers)
+                    return FetchResult(url, response.content, status, None, attempt + 1, time.monotonic() - started)
+                else:
+                    error = f"HTTP {status}"
+            except requests.exceptions.HTTPError as e:
+                # Client errors (404 etc.) will not get better by retrying
+                return FetchResult(url, None, status, str(e), attempt + 1, time.monotonic() - started)
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+            if attempt < self.max_retries:
+                delay = self._backoff_delay(attempt, response)
+                if time.monotonic() + delay >= deadline_at:
+                    error = f"{error} (deadline exceeded before retry)"
+                    break
+                time.sleep(delay)
+        return FetchResult(url, None, status, error, attempt + 1, time.monotonic() - started)
+
+    def fetch_all(self, urls):
+        # Results come back in the same order as `urls`, whatever order they complete in
+        deadline_at = time.monotonic() + self.total_deadline
+        unique_urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {url: pool.submit(self.fetch, url, deadline_at) for url in unique_urls}
+            results = {url: future.result() for url, future in futures.items()}
+        return [results[url] for url in urls]
+
+    def iter_fetch(self, urls, window=None):
+        # Like fetch_all, but yields each result (in `urls` order) as soon as it is ready. At most
+        # `window` pages are in flight or waiting to be consumed, so bodies don't pile up in memory.
+        # The total deadline covers fetching only: time the consumer spends on a yielded result
+        # extends the deadline of every page submitted after it, so slow parsing can't starve fetches.
+        started = time.monotonic()
+        consumer_seconds = 0.0
+        window = window or self.max_workers * 2
+        urls = iter(urls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            submit = lambda url: pool.submit(self.fetch, url, started + consumer_seconds + self.total_deadline)
+            pending = deque(submit(url) for url in itertools.islice(urls, window))
+            while pending:
+                result = pending.popleft().result()
+                for url in itertools.islice(urls, 1):
+                    pending.append(submit(url))
+                yielded_at = time.monotonic()
+                yield result
+                consumer_seconds += time.monotonic() - yielded_at
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+# --- Configuration ---
+FX_URL = 'https://open.er-api.com/v6/latest/USD'   # Free daily rates, no API key; USD per unit base
+FX_FILE = 'fx_rates.json'                           # Shared by every worker; refreshed when older than FX_MAX_AGE_HOURS
+FX_MAX_AGE_HOURS = 12
+FX_RETRY_MINUTES = 15                               # Back-off after a failed download
+FX_TIMEOUT = 10
+# Approximate units per USD (mid-2025). Only used until the first successful download, so
+# cross-region queries still work on a fresh, offline install; responses report the source.
+FALLBACK_RATES = {'USD': 1.0, 'INR': 85.5, 'CAD': 1.37, 'GBP': 0.74, 'AUD': 1.53, 'SGD': 1.28, 'JPY': 145.0, 'EUR': 0.86}
+
+
+class FxTable:
+    # Cached exchange-rate table. Lookups never block on the network: a stale table is served while
+    # one background thread downloads a fresh one.
+    def __init__(self, path=FX_FILE, url=FX_URL, max_age_hours=FX_MAX_AGE_HOURS):
+        self.path = path
+        self.url = url
+        self.max_age = max_age_hours * 3600
+        self.rates = dict(FALLBACK_RATES)
+        self.source = 'fallback'
+        self.fetched_at = None
+        self.retry_not_before = 0
+        self.refreshing = False
+        self.lock = threading.Lock()
+        self._load_file()
+
+    def _load_file(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            rates, fetched_at = cached["rates"], float(cached["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        with self.lock:
+            self.rates, self.source, self.fetched_at = rates, cached.get("source", self.url), fetched_at
+        return True
+
+    def _is_stale(self):
+        return self.fetched_at is None or time.time() - self.fetched_at >= self.max_age
+
+    def refresh(self):
+        # Downloads the table and writes it to FX_FILE; returns True on success
+        try:
+            response = requests.get(self.url, timeout=FX_TIMEOUT)
+            response.raise_for_status()
+            payload = response.json()
+            rates = {code: float(rate) for code, rate in payload["rates"].items() if rate}
+            if 'USD' not in rates:
+                raise ValueError("rates are not based on USD")
+        except (requests.RequestException, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"FX rate refresh failed: {e}. Using {self.source} rates.")
+            self.retry_not_before = time.time() + FX_RETRY_MINUTES * 60
+            return False
+        fetched_at = time.time()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"source": self.url, "fetched_at": fetched_at, "rates": rates}, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        with self.lock:
+            self.rates, self.source, self.fetched_at = rates, self.url, fetched_at
+        return True
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        finally:
+            self.refreshing = False
+
+    def _ensure_fresh(self):
+        if not self._is_stale():
+            return
+        # Another worker may already have downloaded a newer table
+        if self._load_file() and not self._is_stale():
+            return
+        with self.lock:
+            if self.refreshing or time.time() < self.retry_not_before:
+                return
+            self.refreshing = True
+        threading.Thread(target=self._refresh_in_background, name='fx-refresh', daemon=True).start()
+
+    def convert(self, amount, from_currency, to_currency):
+        # Raises KeyError for a currency the table doesn't know
+        if from_currency == to_currency:
+            return amount
+        self._ensure_fresh()
+        rates = self.rates
+        return amount / rates[from_currency] * rates[to_currency]
+
+    def describe(self):
+        return {"source": self.source,
+                "as_of": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.fetched_at)) if self.fetched_at else None}
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+# --- Configuration ---
+CACHE_DIR = '.http_cache'
+INDEX_FILE = 'index.json'
+MAX_CACHE_BYTES = 64 * 1024 * 1024   # Compressed bytes kept on disk before LRU eviction
+MAX_ENTRY_AGE_HOURS = 24 * 14        # Entries unused for longer than this are dropped
+COMPRESSION_LEVEL = 6
+
+
+class HttpCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, max_age_hours=MAX_ENTRY_AGE_HOURS, index_file=INDEX_FILE):
+        self.directory = directory
+        self.index_file = index_file
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_hours * 3600
+        self.lock = threading.Lock()
+        self.index = self._load_index()
+        self.reset_stats()
+
+    def _index_path(self):
+        return os.path.join(self.directory, self.index_file)
+
+    def _body_path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.z')
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def reset_stats(self):
+        self.stats = {"hits": 0, "misses": 0, "bytes_downloaded": 0, "bytes_saved": 0}
+
+    def conditional_headers(self, url):
+        with self.lock:
+            entry = self.index.get(url)
+        if not entry or not os.path.exists(self._body_path(url)):
+            return {}
+        headers = {}
+        if entry.get("etag"): headers['If-None-Match'] = entry["etag"]
+        if entry.get("last_modified"): headers['If-Modified-Since'] = entry["last_modified"]
+        return headers
+
+    def load(self, url):
+        try:
+            with open(self._body_path(url), 'rb') as f:
+                return zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+
+    def record_hit(self, url, content):
+        # A 304: the body we already hold is still current
+        with self.lock:
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += len(content)
+            if url in self.index:
+                self.index[url]["last_used"] = time.time()
+
+    def store(self, url, content, response_headers):
+        with self.lock:
+            self.stats["misses"] += 1
+            self.stats["bytes_downloaded"] += len(content)
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if not etag and not last_modified:
+            # Nothing to revalidate with, so caching the body would never pay off; any older entry's
+            # validators no longer describe what the server sends and must not be replayed
+            self.forget(url)
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        compressed = zlib.compress(content, COMPRESSION_LEVEL)
+        tmp_path = self._body_path(url) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, self._body_path(url))
+        now = time.time()
+        with self.lock:
+            self.index[url] = {"etag": etag, "last_modified": last_modified, "size": len(compressed),
+                               "raw_size": len(content), "stored_at": now, "last_used": now}
+
+    def forget(self, url):
+        with self.lock:
+            self.index.pop(url, None)
+        try: os.remove(self._body_path(url))
+        except OSError: pass
+
+    def evict(self):
+        now = time.time()
+        with self.lock:
+            expired = [url for url, entry in self.index.items() if now - entry["last_used"] > self.max_age_seconds]
+            by_age = sorted((entry["last_used"], url) for url, entry in self.index.items() if url not in expired)
+            total = sum(self.index[url]["size"] for _, url in by_age)
+            while by_age and total > self.max_bytes:
+                _, url = by_age.pop(0)
+                total -= self.index[url]["size"]
+                expired.append(url)
+        for url in expired:
+            self.forget(url)
+        return len(expired)
+
+    def save(self):
+        self.evict()
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.index)
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self._index_path())
+
+    def report(self):
+        s = self.stats
+        total = s["hits"] + s["misses"]
+        hit_rate = (s["hits"] / total * 100) if total else 0
+        return (f"HTTP cache: {s['hits']} hit(s) / {s['misses']} miss(es) ({hit_rate:.0f}% hit rate), "
+                f"{s['bytes_downloaded'] / 1024:.0f} KB downloaded, {s['bytes_saved'] / 1024:.0f} KB saved")
@@ -0,0 +1,112 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+from datetime import datetime
+
+import pipeline
+
+# --- Configuration ---
+STATE_FILE = 'scrape_state.json'       # Per-URL content fingerprints from the last run
+CHANGES_FILE = 'scrape_changes.json'   # Change-set of the last run
+# Parts of a page that differ on every request without the products changing (e.g. the cookie
+# expiry Apple stamps into each response); blanked out before fingerprinting
+FINGERPRINT_IGNORE_PATTERNS = [re.compile(rb'document\.cookie\s*=\s*"[^"]*"')]
+# A configuration is identified by everything except its price and scrape time
+PRODUCT_KEY_FIELDS = ('url', 'name', 'chip', 'cpu_cores', 'gpu_cores', 'ram_gb', 'storage_tb', 'screen_size_inch')
+
+
+def page_fingerprint(content):
+    for pattern in FINGERPRINT_IGNORE_PATTERNS:
+        content = pattern.sub(b'', content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def product_key(product):
+    return tuple(product.get(field) for field in PRODUCT_KEY_FIELDS)
+
+
+def diff_catalogues(old_products, new_products, price_field='price_inr'):
+    old = {product_key(p): p for p in old_products}
+    new = {product_key(p): p for p in new_products}
+    added = [new[key] for key in new if key not in old]
+    removed = [old[key] for key in old if key not in new]
+    repriced = [{**dict(zip(PRODUCT_KEY_FIELDS, key)), f"old_{price_field}": old[key].get(price_field), f"new_{price_field}": new[key].get(price_field)}
+                for key in new if key in old and old[key].get(price_field) != new[key].get(price_field)]
+    return {"added": added, "removed": removed, "repriced": repriced}
+
+
+def key_order(product):
+    # Sort key grouping a catalogue by page, then by product key; what diff_catalogue_streams walks.
+    # Numbers are compared as floats, so 1 and 1.0 are the same key, as they are in diff_catalogues.
+    key = tuple(float(value) if type(value) in (int, float, bool) else value for value in product_key(product))
+    return [product.get("url") or '', repr(key)]
+
+
+def _by_key(records, presorted):
+    # (key, position, product) per distinct product key in key_order. As in diff_catalogues' dicts,
+    # a duplicated key keeps its first position and its last product.
+    keyed = ([key_order(product), position, product] for position, product in records)
+    if not presorted:
+        keyed = pipeline.external_sort(keyed, lambda record: record[0])
+    for key, group in itertools.groupby(keyed, key=lambda record: record[0]):
+        first = last = next(group)
+        for last in group:
+            pass
+        yield key, first[1], last[2]
+
+
+def diff_catalogue_streams(old_records, new_records, price_field='price_inr', old_sorted=False):
+    # Same change-set as diff_catalogues, for catalogues read from disk: both sides are (catalogue
+    # position, product) streams, sorted by key_order in bounded memory (pipeline.external_sort)
+    # and walked together, so only the changes are held. Each list keeps catalogue order.
+    # old_sorted: old_records already come in key_order, e.g. from a PageStore built with it.
+    added, removed, repriced = [], [], []
+    old, new = _by_key(old_records, old_sorted), _by_key(new_records, False)
+    old_item, new_item = next(old, None), next(new, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or old_item is not None and old_item[0] < new_item[0]:
+            removed.append(old_item[1:])
+            old_item = next(old, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            added.append(new_item[1:])
+            new_item = next(new, None)
+        else:
+            old_price, new_price = old_item[2].get(price_field), new_item[2].get(price_field)
+            if old_price != new_price:
+                repriced.append((new_item[1], {**dict(zip(PRODUCT_KEY_FIELDS, product_key(new_item[2]))),
+                                               f"old_{price_field}": old_price, f"new_{price_field}": new_price}))
+            old_item, new_item = next(old, None), next(new, None)
+    in_order = lambda items: [product for _, product in sorted(items, key=lambda item: item[0])]
+    return {"added": in_order(added), "removed": in_order(removed), "repriced": in_order(repriced)}
+
+
+def is_empty(changes):
+    return not (changes["added"] or changes["removed"] or changes["repriced"])
+
+
+def save_changes(changes, path=CHANGES_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"generated_at": datetime.now().isoformat(), **changes}, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def summarize(changes):
+    return f"{len(changes['added'])} added, {len(changes['removed'])} removed, {len(changes['repriced'])} repriced"
@@ -0,0 +1,239 @@
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Configuration ---
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SCRAPE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'   # Prometheus text exposition format
+PROFILE_INTERVAL_SECONDS = 0.01     # Time between stack samples while the profiler runs
+PROFILE_MAX_SECONDS = 300           # A profiler somebody forgot to stop switches itself off
+PROFILE_MAX_DEPTH = 64              # Innermost frames kept per sampled stack
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    # One metric family. Label values are passed positionally in the order of `labels`; each
+    # distinct combination is a series kept in a dict under one lock, so recording is a dict lookup
+    # and an addition.
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def _check(self, label_values):
+        if len(label_values) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {label_values}")
+
+    def samples(self):
+        # (suffix, label values, extra labels, value) for every line of the exposition
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, label_values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, label_values, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        self._check(label_values)
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.series.items())
+        return [('', labels, (), value) for labels, value in items]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *label_values):
+        self._check(label_values)
+        with self.lock:
+            self.series[label_values] = value
+
+    def remove(self, *label_values):
+        with self.lock:
+            self.series.pop(label_values, None)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.series.items())
+        return [('', labels, (), value) for labels, value in items]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        self._check(label_values)
+        # Per-bucket (not cumulative) counts; the last slot is +Inf. Cumulated only when rendered.
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((labels, list(counts), total) for labels, (counts, total) in self.series.items())
+        samples = []
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', labels, (('le', _format_value(float(bound))),), cumulative))
+            samples.append(('_sum', labels, (), total))
+            samples.append(('_count', labels, (), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        # Registering the same name twice returns the first metric, so modules can be re-imported
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# Everything in this process shares one registry; with several gunicorn workers each worker
+# exposes its own numbers, which Prometheus tells apart by instance.
+REGISTRY = Registry()
+
+
+def counter(name, help_text, labels=()):
+    return REGISTRY.register(Counter(name, help_text, labels))
+
+
+def gauge(name, help_text, labels=()):
+    return REGISTRY.register(Gauge(name, help_text, labels))
+
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, labels, buckets))
+
+
+def render():
+    return REGISTRY.render()
+
+
+class SamplingProfiler:
+    # Statistical profiler for a live process: a daemon thread records every other thread's stack
+    # every PROFILE_INTERVAL_SECONDS. Nothing is hooked into the code being profiled, so it can be
+    # switched on in production; while it is off it costs nothing. The report is in the collapsed
+    # "frame;frame;frame count" format that flamegraph.pl and speedscope read.
+    def __init__(self, interval=PROFILE_INTERVAL_SECONDS, max_seconds=PROFILE_MAX_SECONDS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, seconds=None):
+        # Starts a fresh profile; returns False if one is already running
+        with self.lock:
+            if self.running:
+                return False
+            self.stacks = collections.Counter()
+            self.samples = 0
+            self.started_at, self.stopped_at = time.time(), None
+            self.stop_event = threading.Event()
+            duration = min(seconds or self.max_seconds, self.max_seconds)
+            self.thread = threading.Thread(target=self._run, args=(self.stop_event, duration),
+                                           name='sampling-profiler', daemon=True)
+            self.thread.start()
+        return True
+
+    def stop(self):
+        with self.lock:
+            thread = self.thread
+            self.stop_event.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self, stop_event, duration):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while not stop_event.wait(self.interval) and time.monotonic() < deadline:
+            sampled = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                sampled.append(';'.join(reversed(stack)))
+            with self.lock:
+                self.stacks.update(sampled)
+                self.samples += 1
+        self.stopped_at = time.time()
+
+    def describe(self):
+        return {"running": self.running, "samples": self.samples, "interval_seconds": self.interval,
+                "started_at": self.started_at, "stopped_at": self.stopped_at}
+
+    def report(self, limit=None):
+        with self.lock:
+            stacks = self.stacks.most_common(limit)
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks)
@@ -0,0 +1,208 @@
+import re
+
+from lxml import etree
+
+from specs import PRICE_PATTERN
+
+# A single SAX-style pass over the raw HTML with lxml's parser-target interface: no element tree
+# is built, we only keep the few strings the scraper actually reads. Text handling mirrors what
+# BeautifulSoup does with the lxml builder (whitespace-only runs collapse to " " or "\n", and
+# strings inside script/style/template/rt/rp are left out of get_text()), so both parsing modes
+# hand scrape_mac_page / scrape_iphone_page exactly the same strings.
+
+CHUNK_SIZE = 64 * 1024
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+NON_TEXT_CONTAINERS = {'script', 'style', 'template', 'rt', 'rp'}  # Strings here are skipped by get_text()
+PRESERVE_WHITESPACE_TAGS = {'pre', 'textarea'}
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+# Selectors shared with scraper.py's BeautifulSoup path
+MAC_CONTAINER_SELECTOR = 'div.rc-productbundle-item, div.as-producttile, div.rf-producttile, .rf-bundle-selection-item'
+MAC_PAGE_PRICE_SELECTOR = '.rc-prices-fullprice, .currentprice .price-value, .as-price-currentprice .price-value, span[data-autom="price"]'
+MAC_ITEM_TITLE_SELECTOR = '.rc-productbundle-title, .as-producttile-title, .rf-producttile-title, .rf-bundle-header-title'
+MAC_ITEM_PRICE_SELECTOR = '.rc-productbundle-price .price-value, .as-producttile-pricecurrent .price-value, .rf-producttile-pricecurrent .price-value, .rf-bundle-price .price-value'
+MAC_ITEM_SPECS_SELECTOR = '.rc-productbundle-configsummary, .as-producttile-specs, .rf-producttile-specs, .rf-bundle-summary'
+IPHONE_PRICE_SELECTORS = ['div[data-autom="price"] span.price-value', 'span[data-autom="price"]', '.rc-prices-fullprice .price-value', '.as-price-currentprice .price-value', '.rf-pdp-price .price-value', '.hero-price .price-value', 'span.currentprice']
+
+_COMPOUND_PATTERN = re.compile(r'([\w-]*)((?:\.[\w-]+)*)((?:\[[\w-]+="[^"]*"\])*)$')
+_ATTR_PATTERN = re.compile(r'\[([\w-]+)="([^"]*)"\]')
+
+
+def compile_selector(selector):
+    # Supports the subset of CSS the scraper uses: tag.class[attr="value"] compounds joined by
+    # descendant combinators, with comma-separated alternatives.
+    alternatives = []
+    for alternative in selector.split(','):
+        chain = []
+        for compound in alternative.split():
+            match = _COMPOUND_PATTERN.match(compound)
+            if not match:
+                raise ValueError(f"Unsupported selector: {compound!r}")
+            tag, classes, attrs = match.groups()
+            chain.append((tag.lower() or None, frozenset(c for c in classes.split('.') if c), tuple(_ATTR_PATTERN.findall(attrs))))
+        alternatives.append(chain)
+    return alternatives
+
+
+def _compound_matches(compound, frame):
+    tag, classes, attrs = compound
+    if tag and tag != frame[0]: return False
+    if classes and not classes <= frame[1]: return False
+    return all(frame[2].get(name) == value for name, value in attrs)
+
+
+def _selector_matches(alternatives, stack):
+    for chain in alternatives:
+        if not _compound_matches(chain[-1], stack[-1]):
+            continue
+        j = len(chain) - 2
+        for frame in reversed(stack[:-1]):
+            if j < 0: break
+            if _compound_matches(chain[j], frame): j -= 1
+        if j < 0:
+            return True
+    return False
+
+
+class _Capture:
+    # Collects the strings of one element, like Tag.get_text(separator, strip=True)
+    __slots__ = ('depth', 'strings')
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.strings = []
+
+    def text(self, separator=''):
+        return separator.join(s.strip() for s in self.strings if s.strip())
+
+
+class _ExtractorTarget:
+    def __init__(self, first_selectors, container_selector=None, item_selectors=None, collect_text=False,
+                 price_pattern=PRICE_PATTERN):
+        self.first_selectors = {name: compile_selector(sel) for name, sel in first_selectors.items()}
+        self.container_selector = compile_selector(container_selector) if container_selector else None
+        self.item_selectors = {name: compile_selector(sel) for name, sel in (item_selectors or {}).items()}
+        self.collect_text = collect_text
+        self.price_pattern = price_pattern
+        self.stack = []
+        self.pending = []
+        self.non_text_depth = 0
+        self.preserve_depth = 0
+        self.captures = []          # Active captures of first matches; closed when their element ends
+        self.first = {}
+        self.title = None
+        self.first_price_string = None
+        self.text_parts = []
+        self.items = []
+        self.open_items = []
+
+    def _flush(self, is_comment=False):
+        if not self.pending:
+            return
+        data = ''.join(self.pending)
+        self.pending = []
+        if not self.preserve_depth and not data.strip(ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        if self.price_pattern.search(data):
+            if self.first_price_string is None:
+                self.first_price_string = data
+            for item in self.open_items:
+                if item["price_string"] is None: item["price_string"] = data
+        if is_comment or self.non_text_depth:
+            return
+        if self.collect_text:
+            self.text_parts.append(data)
+        for capture in self.captures:
+            capture.strings.append(data)
+
+    def _open_capture(self):
+        capture = _Capture(len(self.stack))
+        self.captures.append(capture)
+        return capture
+
+    def start(self, tag, attrib, nsmap=None):
+        self._flush()
+        tag = tag.lower()
+        frame = (tag, frozenset(attrib.get('class', '').split()), attrib)
+        self.stack.append(frame)
+        if tag in NON_TEXT_CONTAINERS: self.non_text_depth += 1
+        if tag in PRESERVE_WHITESPACE_TAGS: self.preserve_depth += 1
+        if self.title is None and tag == 'title' and len(self.stack) >= 2 and self.stack[-2][0] == 'head':
+            self.title = self._open_capture()
+        for name, selector in self.first_selectors.items():
+            if name not in self.first and _selector_matches(selector, self.stack):
+                self.first[name] = self._open_capture()
+        for item in self.open_items:
+            for name, selector in self.item_selectors.items():
+                if item[name] is None and _selector_matches(selector, self.stack):
+                    item[name] = self._open_capture()
+        if self.container_selector and _selector_matches(self.container_selector, self.stack):
+            item = dict.fromkeys(self.item_selectors)
+            item["price_string"] = None
+            item["_depth"] = len(self.stack)
+            self.items.append(item)
+            self.open_items.append(item)
+
+    def end(self, tag):
+        self._flush()
+        depth = len(self.stack)
+        self.captures = [c for c in self.captures if c.depth != depth]
+        self.open_items = [item for item in self.open_items if item["_depth"] != depth]
+        tag = self.stack.pop()[0]
+        if tag in NON_TEXT_CONTAINERS: self.non_text_depth -= 1
+        if tag in PRESERVE_WHITESPACE_TAGS: self.preserve_depth -= 1
+
+    def data(self, data):
+        self.pending.append(data)
+
+    def comment(self, text):
+        self._flush()
+        self.pending.append(text)
+        self._flush(is_comment=True)
+
+    def close(self):
+        self._flush()
+        return self
+
+
+def _detect_encoding(content):
+    match = META_CHARSET_PATTERN.search(content[:4096])
+    return match.group(1).decode('ascii') if match else 'utf-8'
+
+
+def _run(content, target):
+    parser = etree.HTMLParser(target=target, strip_cdata=False, recover=True, encoding=_detect_encoding(content))
+    for offset in range(0, len(content), CHUNK_SIZE):
+        parser.feed(content[offset:offset + CHUNK_SIZE])
+    return parser.close()
+
+
+def _text(capture, separator=''):
+    return capture.text(separator) if capture is not None else None
+
+
+def extract_mac_page(content, price_pattern=PRICE_PATTERN):
+    target = _run(content, _ExtractorTarget(
+        {"price": MAC_PAGE_PRICE_SELECTOR}, MAC_CONTAINER_SELECTOR,
+        {"title": MAC_ITEM_TITLE_SELECTOR, "price": MAC_ITEM_PRICE_SELECTOR, "specs": MAC_ITEM_SPECS_SELECTOR},
+        collect_text=True, price_pattern=price_pattern))
+    return {
+        "title": _text(target.title),
+        "price_text": _text(target.first.get("price")),
+        "price_string": target.first_price_string,
+        "text": ''.join(target.text_parts),
+        "items": [{"title": _text(item["title"], ' '), "price_text": _text(item["price"]),
+                   "price_string": item["price_string"], "specs": _text(item["specs"], ' ')}
+                  for item in target.items],
+    }
+
+
+def extract_iphone_page(content, price_pattern=PRICE_PATTERN):
+    target = _run(content, _ExtractorTarget({i: sel for i, sel in enumerate(IPHONE_PRICE_SELECTORS)},
+                                            price_pattern=price_pattern))
+    price_text = None
+    for i in range(len(IPHONE_PRICE_SELECTORS)):
+        if i in target.first:
+            price_text = _text(target.first[i])
+            break
+    return {"price_text": price_text, "price_string": target.first_price_string}
@@ -0,0 +1,246 @@
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import time
+
+# --- Configuration ---
+JOURNAL_FILE = 'scrape_journal.ndjson'  # Products of the run in progress, one JSON object per line
+FSYNC_SECONDS = 5                       # A crash loses at most this much finished work
+JOURNAL_MAX_AGE_HOURS = 12              # Older journals are from an abandoned run and are not resumed
+MERGE_RUN_SIZE = 10000                  # Products sorted in memory at a time by the external merge
+COMPLETED_KEY = '_completed'            # Marks the end of one page's products in the journal
+READ_SIZE = 1 << 16                     # Characters read at a time when streaming a JSON array
+
+
+class NdjsonJournal:
+    # Append-only log of scraped products. Each page's product lines are followed by a marker line
+    # {"_completed": url, "fingerprint": ...}; lines after the last marker belong to a page that was
+    # interrupted and are dropped when the journal is resumed.
+    def __init__(self, path, resume_from=None):
+        self.path = path
+        if resume_from is None:
+            self.file = open(path, 'wb')
+        else:
+            self.file = open(path, 'r+b')
+            self.file.truncate(resume_from)
+            self.file.seek(resume_from)
+        self.last_sync = time.monotonic()
+
+    def write_page(self, url, products, fingerprint=None):
+        lines = [json.dumps(product, ensure_ascii=False) for product in products]
+        lines.append(json.dumps({COMPLETED_KEY: url, "fingerprint": fingerprint, "products": len(products)}))
+        self.file.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        self.file.flush()
+        if time.monotonic() - self.last_sync >= FSYNC_SECONDS:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _journal_records(path):
+    # (offset after the line, record) for every complete line; stops at a torn final line
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                return
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            offset += len(line)
+            yield offset, record
+
+
+def load_journal(path, max_age_hours=JOURNAL_MAX_AGE_HOURS):
+    # Returns ({url: fingerprint} of completed pages in journal order, resume offset), or ({}, None)
+    # when there is nothing usable to resume
+    try:
+        if time.time() - os.path.getmtime(path) > max_age_hours * 3600:
+            return {}, None
+        completed, resume_from = {}, 0
+        for offset, record in _journal_records(path):
+            if COMPLETED_KEY in record:
+                completed[record[COMPLETED_KEY]] = record.get("fingerprint")
+                resume_from = offset
+    except OSError:
+        return {}, None
+    return (completed, resume_from) if completed else ({}, None)
+
+
+def iter_journal_products(path):
+    # Products of completed pages, in journal order, without loading the journal into memory
+    page = []
+    for _, record in _journal_records(path):
+        if COMPLETED_KEY in record:
+            yield from page
+            page = []
+        else:
+            page.append(record)
+
+
+def remove_journal(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_run(products, directory):
+    run = tempfile.TemporaryFile('w+', encoding='utf-8', dir=directory)
+    for product in products:
+        run.write(json.dumps(product, ensure_ascii=False))
+        run.write('\n')
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    for line in run:
+        yield json.loads(line)
+
+
+def external_sort(products, key, run_size=MERGE_RUN_SIZE, directory=None):
+    # Stable sort of an arbitrarily long product stream: sorted runs of `run_size` go to temporary
+    # files, which are then merged lazily. heapq.merge prefers earlier runs on ties, so products
+    # with equal keys keep their input order, as with sorted().
+    runs = []
+    try:
+        while True:
+            chunk = list(itertools.islice(products, run_size))
+            if not chunk:
+                break
+            chunk.sort(key=key)
+            if not runs and len(chunk) < run_size:
+                yield from chunk  # Everything fit in one run; no files needed
+                return
+            runs.append(_write_run(chunk, directory))
+        yield from heapq.merge(*(_read_run(run) for run in runs), key=key)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def write_json_array(products, path):
+    # Streams the same bytes json.dump(products, f, indent=4, ensure_ascii=False) would write;
+    # returns how many products were written
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for product in products:
+            f.write('[\n    ' if count == 0 else ',\n    ')
+            f.write(json.dumps(product, indent=4, ensure_ascii=False).replace('\n', '\n    '))
+            count += 1
+        f.write('\n]' if count else '[]')
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+
+def iter_json_array(path):
+    # Items of a JSON array file one at a time, so a catalogue is never loaded whole; raises
+    # ValueError (after yielding the items before it) if the file is not a well-formed array
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, position, eof = '', 0, False
+        expect = '['  # '[', 'item or ]', 'item', ', or ]'
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position == len(buffer) and eof:
+                raise ValueError(f"{path} ends before its JSON array does")
+            if position < len(buffer):
+                char = buffer[position]
+                if expect == '[':
+                    if char != '[':
+                        raise ValueError(f"{path} does not hold a JSON array")
+                    position, expect = position + 1, 'item or ]'
+                    continue
+                if char == ']' and expect != 'item':
+                    rest = buffer[position + 1:]
+                    while not rest.strip() and not eof:
+                        rest = f.read(READ_SIZE)
+                        eof = not rest
+                    if rest.strip():
+                        raise ValueError(f"{path} has data after its JSON array")
+                    return
+                if expect == ', or ]':
+                    if char != ',':
+                        raise ValueError(f"{path}: expected ',' or ']' but found {char!r}")
+                    position, expect = position + 1, 'item'
+                    continue
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    if eof:
+                        raise
+                    end = None
+                # An item is only trusted once the separator after it has been read: a number cut off
+                # by the end of the buffer ("2.5e" of "2.5e10") would decode short
+                if end is not None and (eof or end < len(buffer) and buffer[end] in ' \t\r\n,]'):
+                    yield item
+                    position, expect = end, ', or ]'
+                    continue
+            more = f.read(READ_SIZE)
+            buffer, position, eof = buffer[position:] + more, 0, not more
+
+
+class PageStore:
+    # Products grouped by page URL in a temporary file, so the previous run's catalogue can be read
+    # page by page while only one offset per page stays in memory. Within a page the file is in
+    # `order` (catalogue order by default), so a caller that needs the store sorted another way
+    # can have it sorted here once. get() works like dict.get on {url: [products]}, in catalogue
+    # order; records() yields (catalogue position, product) in file order.
+    def __init__(self, products, order=None, directory=None):
+        self.file = tempfile.TemporaryFile('w+b', dir=directory)
+        self.pages = {}   # url -> (offset, product count)
+        self.count = 0
+        url = lambda record: record[1].get("url") or ''
+        sort_key = lambda record: (url(record), order(record[1]) if order else record[0])
+        positioned = ([position, product] for position, product in enumerate(products))
+        for page_url, records in itertools.groupby(external_sort(positioned, sort_key, directory=directory), key=url):
+            offset, count = self.file.tell(), 0
+            for record in records:
+                self.file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                count += 1
+            self.pages[page_url] = (offset, count)
+            self.count += count
+
+    def _lines(self, offset, count):
+        self.file.seek(offset)
+        return [self.file.readline() for _ in range(count)]
+
+    def get(self, url, default=None):
+        page = self.pages.get(url or '')
+        if not page:
+            return default
+        return [product for _, product in sorted(json.loads(line) for line in self._lines(*page))]
+
+    def records(self):
+        # Read MERGE_RUN_SIZE lines at a time, so get() calls in between don't lose the place
+        offset, left = 0, self.count
+        while left:
+            lines = self._lines(offset, min(left, MERGE_RUN_SIZE))
+            offset, left = self.file.tell(), left - len(lines)
+            for line in lines:
+                yield tuple(json.loads(line))
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from urllib.request import pathname2url
+
+from incremental import PRODUCT_KEY_FIELDS, product_key
+
+# Every price the scraper has seen, one SQLite file per region. A product's price is stored when it
+# changes rather than on every run, so years of hourly scrapes keep one row per price change, and
+# each row carries the price it replaced, so price drops are a range scan over the time index
+# instead of a comparison of consecutive snapshots. Rows are only ever added.
+
+# --- Configuration ---
+HISTORY_FILE = 'price_history.db'   # Per-region files get a suffix, e.g. price_history_us.db
+DROP_WINDOW_HOURS = 24 * 7          # How far back /price_drops looks by default
+MAX_DROPS = 500                     # Most drops returned by one query
+BUSY_TIMEOUT_SECONDS = 10           # Readers and the writer wait this long for each other's locks
+
+# Spec columns are untyped so SQLite keeps ints as ints and floats as floats, as in the catalogue
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,           -- JSON of incremental.PRODUCT_KEY_FIELDS
+    category, url, name, chip, cpu_cores, gpu_cores, ram_gb, storage_tb, screen_size_inch,
+    part_numbers TEXT,                  -- JSON list
+    price REAL,                         -- Latest price, so a run only writes the products whose price moved
+    first_seen INTEGER NOT NULL,        -- Unix seconds
+    last_seen INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prices (
+    product_id INTEGER NOT NULL REFERENCES products (id),
+    observed_at INTEGER NOT NULL,       -- Unix seconds of the run that first saw this price
+    price REAL NOT NULL,
+    previous_price REAL,                -- NULL for a product's first price
+    PRIMARY KEY (product_id, observed_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS prices_by_time ON prices (observed_at);
+CREATE INDEX IF NOT EXISTS prices_by_price ON prices (product_id, price, observed_at);
+CREATE TABLE IF NOT EXISTS part_numbers (
+    part_number TEXT PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES products (id)
+) WITHOUT ROWID;
+"""
+PRODUCT_COLUMNS = ('category',) + PRODUCT_KEY_FIELDS
+
+
+def connect(path, readonly=False):
+    if readonly:
+        db = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_SECONDS)
+    else:
+        db = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS)
+        db.execute('PRAGMA journal_mode=WAL')  # The app keeps reading while a scrape writes
+        db.execute('PRAGMA synchronous=NORMAL')  # A power cut can lose the last run, never corrupt the file
+        db.executescript(SCHEMA)
+    db.row_factory = sqlite3.Row
+    return db
+
+
+def record_snapshot(products, price_field, path=HISTORY_FILE, observed_at=None):
+    # Adds one scrape's prices in a single transaction; returns how many prices changed (a new
+    # product's first price counts as a change). Unpriced products are tracked but get no rows.
+    observed_at = int(time.time() if observed_at is None else observed_at)
+    db = connect(path)
+    try:
+        with db:
+            known = {row['key']: (row['id'], row['price'], row['part_numbers'])
+                     for row in db.execute('SELECT id, key, price, part_numbers FROM products')}
+            changes, seen, updates, part_numbers = [], set(), [], []
+            for product in products:
+                key = json.dumps(product_key(product), ensure_ascii=False)
+                if key in seen:
+                    continue  # Same configuration listed twice; the first listing wins, as in the catalogue diff
+                seen.add(key)
+                price = product.get(price_field)
+                price = None if price is None else float(price)
+                parts = json.dumps(product.get("part_numbers") or [])
+                product_id, previous, previous_parts = known.get(key, (None, None, None))
+                if product_id is None:
+                    product_id = db.execute(
+                        f"INSERT INTO products (key, {', '.join(PRODUCT_COLUMNS)}, part_numbers, price, first_seen, last_seen) "
+                        f"VALUES (?, {', '.join('?' * len(PRODUCT_COLUMNS))}, ?, ?, ?, ?)",
+                        (key, *(product.get(field) for field in PRODUCT_COLUMNS), parts, price, observed_at, observed_at)).lastrowid
+                else:
+                    updates.append((parts, price, observed_at, product_id))
+                if price is not None and price != previous:
+                    changes.append((product_id, observed_at, price, previous))
+                if parts != previous_parts:
+                    part_numbers.extend((part, product_id) for part in product.get("part_numbers") or ())
+            db.executemany('UPDATE products SET part_numbers = ?, price = coalesce(?, price), last_seen = ? WHERE id = ?', updates)
+            db.executemany('INSERT OR REPLACE INTO prices (product_id, observed_at, price, previous_price) VALUES (?, ?, ?, ?)', changes)
+            db.executemany('INSERT OR REPLACE INTO part_numbers (part_number, product_id) VALUES (?, ?)', part_numbers)
+    finally:
+        db.close()
+    return len(changes)
+
+
+def _time(seconds):
+    return datetime.fromtimestamp(seconds).isoformat() if seconds is not None else None
+
+
+def _product(row, price_field):
+    return {"id": row['id'], **{field: row[field] for field in PRODUCT_COLUMNS},
+            "part_numbers": json.loads(row['part_numbers'] or '[]'), price_field: row['price'],
+            "first_seen": _time(row['first_seen']), "last_seen": _time(row['last_seen'])}
+
+
+class PriceHistory:
+    # Read side, for the app. Every query is answered from an index: a product's history and its
+    # lowest price from the (product, ...) keys, drops from the time index. sqlite3 connections
+    # can't be shared between threads, so each thread opens its own read-only one.
+    def __init__(self, path, price_field):
+        self.path = path
+        self.price_field = price_field
+        self.local = threading.local()
+
+    def _db(self):
+        # None until the scraper has written the file
+        db = getattr(self.local, 'db', None)
+        if db is None and os.path.exists(self.path):
+            db = self.local.db = connect(self.path, readonly=True)
+        return db
+
+    def find_product(self, product_id=None, part_number=None):
+        db = self._db()
+        if db is None:
+            return None
+        if part_number is not None:
+            row = db.execute('SELECT products.* FROM part_numbers JOIN products ON products.id = part_numbers.product_id '
+                             'WHERE part_number = ?', (part_number,)).fetchone()
+        else:
+            row = db.execute('SELECT * FROM products WHERE id = ?', (product_id,)).fetchone()
+        return _product(row, self.price_field) if row else None
+
+    def history(self, product_id, since=None, until=None):
+        # Price changes of one product, oldest first; since/until are Unix seconds. With `since`, the
+        # change that set the price in force at that moment comes first, so the series has a start.
+        db = self._db()
+        if db is None:
+            return []
+        rows = db.execute('SELECT observed_at, price FROM prices WHERE product_id = ? AND observed_at BETWEEN ? AND ? '
+                          'ORDER BY observed_at', (product_id, since or 0, 2 ** 62 if until is None else until)).fetchall()
+        if since:
+            rows[:0] = db.execute('SELECT observed_at, price FROM prices WHERE product_id = ? AND observed_at < ? '
+                                  'ORDER BY observed_at DESC LIMIT 1', (product_id, since)).fetchall()
+        return [{"at": _time(row['observed_at']), "price": row['price']} for row in rows]
+
+    def lowest(self, product_id):
+        # The lowest price ever recorded and when it was first seen, or None
+        db = self._db()
+        if db is None:
+            return None
+        row = db.execute('SELECT price, observed_at FROM prices WHERE product_id = ? ORDER BY price, observed_at LIMIT 1',
+                         (product_id,)).fetchone()
+        return {"price": row['price'], "at": _time(row['observed_at'])} if row else None
+
+    def drops(self, since, min_percent=0, category=None, product_id=None, limit=MAX_DROPS):
+        # Price decreases recorded at or after `since` (Unix seconds), newest first, each with the
+        # product's lowest-ever price so callers can tell a new low from a partial recovery
+        db = self._db()
+        if db is None:
+            return []
+        query = ('SELECT products.*, prices.observed_at AS changed_at, prices.price AS new_price, prices.previous_price, '
+                 '(SELECT min(price) FROM prices AS lows WHERE lows.product_id = prices.product_id) AS lowest_price '
+                 'FROM prices JOIN products ON products.id = prices.product_id '
+                 'WHERE prices.observed_at >= ? AND prices.price < prices.previous_price '
+                 'AND prices.previous_price - prices.price >= prices.previous_price * ? / 100.0')
+        params = [since, min_percent]
+        if category is not None:
+            query += ' AND products.category = ?'
+            params.append(category)
+        if product_id is not None:
+            query += ' AND prices.product_id = ?'
+            params.append(product_id)
+        query += ' ORDER BY prices.observed_at DESC, products.id LIMIT ?'
+        params.append(limit)
+        drops = []
+        for row in db.execute(query, params):
+            drop = row['previous_price'] - row['new_price']
+            drops.append({"product": _product(row, self.price_field), "at": _time(row['changed_at']),
+                          "price": row['new_price'], "previous_price": row['previous_price'], "drop": drop,
+                          "drop_percent": round(100 * drop / row['previous_price'], 2) if row['previous_price'] else None,
+                          "lowest_price": row['lowest_price'], "is_lowest_ever": row['new_price'] <= row['lowest_price']})
+        return drops
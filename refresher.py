@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Configuration ---
+LOCK_FILE = 'refresh.lock'
+POLL_SECONDS = 60                  # How often each worker checks for a newer catalogue file / stale data
+RETRY_AFTER_FAILURE_MINUTES = 30   # Back-off after a scrape that produced nothing
+RETRY_FILE_SUFFIX = '.retry'       # Next to the lock file: when any worker may scrape again after a failure
+
+
+def try_lock(path):
+    # Non-blocking exclusive lock shared by every process on this host; returns the open handle or None
+    handle = open(path, 'a+')
+    try:
+        if fcntl:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        return handle
+    except OSError:
+        handle.close()
+        return None
+
+
+def unlock(handle):
+    try:
+        if fcntl:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        handle.close()
+
+
+class BackgroundRefresher:
+    # One thread per worker process. Every worker reloads when the products file changes on disk;
+    # only the worker holding LOCK_FILE runs the scraper, so apple.com is scraped once per interval.
+    # A failed scrape's back-off is written next to the lock file, so it holds for every worker.
+    def __init__(self, products_file, interval_hours, scrape, reload, get_last_scraped, set_last_scraped,
+                 lock_file=LOCK_FILE, poll_seconds=POLL_SECONDS):
+        self.products_file = products_file
+        self.interval = timedelta(hours=interval_hours)
+        self.scrape = scrape
+        self.reload = reload
+        self.get_last_scraped = get_last_scraped
+        self.set_last_scraped = set_last_scraped
+        self.lock_file = lock_file
+        self.poll_seconds = poll_seconds
+        self.retry_file = lock_file + RETRY_FILE_SUFFIX
+        self.loaded_mtime = self._products_mtime()
+        self.scrape_requested = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _products_mtime(self):
+        try: return os.path.getmtime(self.products_file)
+        except OSError: return None
+
+    def retry_not_before(self):
+        # Unix time before which no worker scrapes again, or None
+        try:
+            with open(self.retry_file, 'r') as f:
+                return float(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _set_retry_not_before(self, when):
+        # Only called while holding the lock
+        if when is None:
+            try:
+                os.remove(self.retry_file)
+            except FileNotFoundError:
+                pass
+            return
+        tmp_path = self.retry_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(repr(when))
+        os.replace(tmp_path, self.retry_file)
+
+    def backing_off(self):
+        retry_not_before = self.retry_not_before()
+        return retry_not_before is not None and time.time() < retry_not_before
+
+    def request_scrape(self):
+        # e.g. the products file on disk is unreadable; scrape on the next check regardless of age
+        self.scrape_requested = True
+
+    def is_stale(self):
+        last_scraped = self.get_last_scraped()
+        return (self.scrape_requested or last_scraped is None or datetime.now() - last_scraped >= self.interval
+                or not os.path.exists(self.products_file))
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='catalogue-refresher', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.check_once()
+            except Exception as e:
+                print(f"Background refresh failed: {e}")
+            self.stop_event.wait(self.poll_seconds)
+
+    def check_once(self):
+        if self.is_stale() and not self.backing_off():
+            self._scrape_if_leader()
+        mtime = self._products_mtime()
+        if mtime is not None and mtime != self.loaded_mtime:
+            self.loaded_mtime = mtime
+            if self.reload():
+                self.scrape_requested = False
+
+    def _scrape_if_leader(self):
+        handle = try_lock(self.lock_file)
+        if handle is None:
+            return  # Another worker is scraping; its new file will be picked up by the mtime check
+        try:
+            if not self.is_stale() or self.backing_off():
+                return  # Another worker scraped, or failed to, while we were waiting for our turn
+            print("Catalogue is stale. Scraping in the background...")
+            try:
+                scraped = self.scrape()
+            except Exception as e:
+                print(f"Background scrape failed: {e}")
+                scraped = False
+            if scraped:
+                self.set_last_scraped()
+                self.scrape_requested = False
+                self._set_retry_not_before(None)
+            else:
+                print(f"Background scrape produced no catalogue. No worker retries for {RETRY_AFTER_FAILURE_MINUTES} minutes.")
+                self._set_retry_not_before(time.time() + RETRY_AFTER_FAILURE_MINUTES * 60)
+        finally:
+            unlock(handle)
@@ -0,0 +1,62 @@
+import re
+
+# --- Configuration ---
+DEFAULT_REGION = 'in'   # Keeps the original file names and the price_inr field
+
+
+class Region:
+    # One Apple Store storefront: where its pages live and how it writes prices
+    def __init__(self, code, name, store_path, currency, symbol, locale, group_separator=',', decimal_separator='.',
+                 symbol_after=False):
+        self.code = code
+        self.name = name
+        self.store_path = store_path            # 'in' for apple.com/in/shop/..., '' for apple.com/shop/...
+        self.currency = currency
+        self.symbol = symbol
+        self.locale = locale
+        self.group_separator = group_separator
+        self.decimal_separator = decimal_separator
+        self.price_field = f"price_{currency.lower()}"
+        # Same shape as specs.PRICE_PATTERN (which is exactly what the India region produces)
+        group, decimals = re.escape(group_separator), rf'(?:{re.escape(decimal_separator)}\d{{2}})?'
+        if symbol_after:  # e.g. "1.299,00 €"
+            self.price_pattern = re.compile(rf'(\d[\d{group}]*{decimals})\s*{re.escape(symbol)}')
+        else:
+            self.price_pattern = re.compile(rf'{re.escape(symbol)}\s*([\d{group}]+{decimals})')
+
+    def __repr__(self):
+        return f"Region({self.code!r})"
+
+    def url(self, url):
+        # Rewrites an apple.com/<region>/shop/... URL for this storefront. Product slugs are the same
+        # across storefronts for the pages in USER_PROVIDED_URLS; stores that sell under other slugs
+        # simply fail to fetch and are reported by the scraper like any other missing page.
+        match = re.match(r'(https?://www\.apple\.com)(?:/[a-z]{2}(?:-[a-z]{2})?)?(/shop/.*)', url)
+        if not match:
+            return url
+        prefix = f"/{self.store_path}" if self.store_path else ''
+        return f"{match.group(1)}{prefix}{match.group(2)}"
+
+    def file_name(self, base_name):
+        # 'apple_products.json' -> 'apple_products_us.json'; the default region keeps the plain names
+        if self.code == DEFAULT_REGION:
+            return base_name
+        root, dot, extension = base_name.rpartition('.')
+        return f"{root}_{self.code}{dot}{extension}" if dot else f"{base_name}_{self.code}"
+
+
+REGIONS = {region.code: region for region in (
+    Region('in', 'India', 'in', 'INR', '₹', 'en-IN'),
+    Region('us', 'United States', '', 'USD', '$', 'en-US'),
+    Region('ca', 'Canada', 'ca', 'CAD', '$', 'en-CA'),
+    Region('uk', 'United Kingdom', 'uk', 'GBP', '£', 'en-GB'),
+    Region('au', 'Australia', 'au', 'AUD', '$', 'en-AU'),
+    Region('sg', 'Singapore', 'sg', 'SGD', '$', 'en-SG'),
+    Region('jp', 'Japan', 'jp', 'JPY', '¥', 'ja-JP'),
+    Region('de', 'Germany', 'de', 'EUR', '€', 'de-DE', group_separator='.', decimal_separator=',', symbol_after=True),
+)}
+
+
+def get_region(code):
+    # Raises KeyError for unknown codes
+    return REGIONS[(code or DEFAULT_REGION).lower()]
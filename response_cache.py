@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+try:
+    import brotli  # Optional (pip install brotli); without it responses are offered in gzip only
+except ImportError:
+    brotli = None
+
+# --- Configuration ---
+MAX_ENTRIES = 2048          # Cached /find_products answers per worker (least recently used are evicted)
+MIN_GZIP_BYTES = 512        # Smaller bodies are sent as-is; compression would barely shrink them
+GZIP_LEVEL = 9              # Bodies are compressed once and served many times, so use the best ratio
+BROTLI_QUALITY = 11         # Same reasoning; the slowest brotli setting is still milliseconds per page
+
+# A response ready to send. gzipped/brotli are None when not worth compressing (or brotli isn't
+# installed). Each encoding gets its own strong ETag, since the bytes on the wire differ.
+CachedBody = namedtuple('CachedBody', ['body', 'gzipped', 'etag', 'gzip_etag', 'mimetype', 'brotli', 'brotli_etag'],
+                        defaults=[None, None])
+
+
+def _smaller(compressed, body):
+    return compressed if compressed is not None and len(compressed) < len(body) else None
+
+
+def make_body(body, mimetype):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    worth_it = len(body) >= MIN_GZIP_BYTES
+    gzipped = _smaller(gzip.compress(body, GZIP_LEVEL, mtime=0) if worth_it else None, body)
+    brotlied = _smaller(brotli.compress(body, quality=BROTLI_QUALITY) if worth_it and brotli else None, body)
+    return CachedBody(body, gzipped, digest, f"{digest}-gzip" if gzipped is not None else None, mimetype,
+                      brotlied, f"{digest}-br" if brotlied is not None else None)
+
+
+class ResponseCache:
+    # LRU of pre-serialized responses. Keys start with the catalogue version, and clear() is called
+    # whenever a new catalogue is swapped in, so stale answers are never served.
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def get_or_build(self, key, build):
+        # build() runs outside the lock; two threads racing on a miss both build and the last one wins
+        entry = self.get(key)
+        return entry if entry is not None else self.put(key, build())
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {"entries": len(self.entries), "max_entries": self.max_entries, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+
+# Spec columns scored by the value engine, in column order
+SPEC_FIELDS = ('ram_gb', 'storage_tb', 'cpu_cores', 'gpu_cores', 'screen_size_inch')
+
+# Weights - these can be tuned, or overridden per request. They are value per unit of spec in
+# WEIGHTS_CURRENCY; regions pricing in another currency scale them by the exchange rate first.
+WEIGHTS_CURRENCY = 'INR'
+DEFAULT_WEIGHTS = {
+    'ram_gb': 25000,          # Value per GB of RAM
+    'storage_tb': 50000,      # Value per TB of SSD Storage
+    'cpu_cores': 7000,        # Value per CPU core
+    'gpu_cores': 10000,       # Value per GPU core
+    'screen_size_inch': 0,    # Value per inch of screen (less critical for pure value)
+}
+
+
+def merge_weights(weights=None):
+    # Per-request overrides on top of the defaults; raises ValueError for unknown or non-numeric weights
+    merged = dict(DEFAULT_WEIGHTS)
+    for field, value in (weights or {}).items():
+        if field not in DEFAULT_WEIGHTS:
+            raise ValueError(f"Unknown weight '{field}'")
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"Weight '{field}' must be a number")
+        merged[field] = value
+    return merged
+
+
+def weight_vector(weights=None):
+    merged = merge_weights(weights)
+    return np.array([merged[field] for field in SPEC_FIELDS], dtype=np.float64)
+
+
+def _spec_value(product, field):
+    value = product.get(field)
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+class ValueScorer:
+    # Column store over a fixed sequence of products: one row per product, one column per spec
+    def __init__(self, products, price_field='price_inr'):
+        self.products = tuple(products)
+        self.specs = np.array([[_spec_value(p, f) for f in SPEC_FIELDS] for p in self.products],
+                              dtype=np.float64).reshape(len(self.products), len(SPEC_FIELDS))
+        prices = [p.get(price_field) for p in self.products]
+        self.prices = np.array([np.inf if price is None else price for price in prices], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.products)
+
+    def scores(self, weights=None, stop=None):
+        # Spec value per rupee for products[:stop]; unpriced or free products score 0
+        specs, prices = self.specs[:stop], self.prices[:stop]
+        raw = specs @ (weights if isinstance(weights, np.ndarray) else weight_vector(weights))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(prices > 0, raw / (prices + 1), raw)
+        scores[(prices == 0) | np.isinf(prices)] = 0
+        return scores
+
+    def top_k(self, k, weights=None, stop=None):
+        # Best `k` of products[:stop]: higher score first, then lower price
+        scores = self.scores(weights, stop)
+        if k <= 0 or scores.size == 0:
+            return []
+        candidates = np.arange(scores.size)
+        if k < scores.size:
+            # Everything scoring at least the k-th best score, so the whole tie group at the cut is
+            # ranked and ties resolve the same way every time
+            cutoff = -np.partition(-scores, k - 1)[k - 1]
+            candidates = candidates[scores >= cutoff]
+        # Rows are in price order with ties in catalogue order, so the row number is the last key,
+        # as in a stable sort of the catalogue
+        order = candidates[np.lexsort((candidates, self.prices[candidates], -scores[candidates]))]
+        return [self.products[i] for i in order[:k]]
+
+
+def get_value_score(product, weights=None, price_field='price_inr'):
+    # Single-product score, same formula as ValueScorer.scores
+    price = product.get(price_field, float('inf'))
+    if price is None or price == 0 or price == float('inf'): return 0 # Avoid division by zero or infinite scores
+    score = sum(_spec_value(product, field) * weight for field, weight in merge_weights(weights).items())
+    # Normalize by price: higher score for cheaper products with good specs
+    # Adding 1 to price to avoid division by zero if price is somehow 0
+    return score / (price + 1) if price > 0 else score
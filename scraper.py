@@ -1,44 +1,80 @@
-import requests
 from bs4 import BeautifulSoup
-import json
+import os
 import re
+import sqlite3
+import threading
+import time
 from datetime import datetime
 from urllib.parse import unquote
 
+from catalogue_store import COLUMNAR_FILE, is_current, write_columnar
+from discovery import SKU_FILE, SkuRegistry, detail_url, discover_products, extract_configurations
+from fetcher import FetchEngine
+from http_cache import INDEX_FILE, HttpCache
+import incremental as incremental_state
+import metrics
+import pipeline
+import price_history
+from regions import DEFAULT_REGION, get_region
+from page_extractor import (IPHONE_PRICE_SELECTORS, MAC_CONTAINER_SELECTOR, MAC_ITEM_PRICE_SELECTOR, MAC_ITEM_SPECS_SELECTOR,
+                            MAC_ITEM_TITLE_SELECTOR, MAC_PAGE_PRICE_SELECTOR, extract_iphone_page, extract_mac_page)
+from specs import PRICE_PATTERN, extract_price_from_text, parse_iphone_specs_from_name, parse_mac_specs
+
 # --- Configuration ---
+# One buy page per product family. Each page embeds every configuration of the family (see
+# discovery.py): the 13-inch MacBook Air page also carries the 15-inch models, and the iPhone model
+# pages carry every size, storage tier and colour, so these replace the per-configuration URLs.
 USER_PROVIDED_URLS = [
     'https://www.apple.com/in/shop/buy-mac/macbook-air/13-inch',
-    "https://www.apple.com/in/shop/buy-mac/macbook-air/15-inch",
     "https://www.apple.com/in/shop/buy-mac/macbook-pro/14-inch-macbook-pro",
     "https://www.apple.com/in/shop/buy-mac/macbook-pro/16-inch-macbook-pro",
     'https://www.apple.com/in/shop/buy-mac/imac',
     'https://www.apple.com/in/shop/buy-mac/mac-mini',
     'https://www.apple.com/in/shop/buy-mac/mac-studio',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.3%22-display-128gb-black-titanium',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.3%22-display-256gb-black-titanium',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.3%22-display-512gb-black-titanium',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.3%22-display-1tb-black-titanium',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.9%22-display-256gb-black-titanium',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.9%22-display-512gb-black-titanium',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.9%22-display-1tb-black-titanium',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.1%22-display-128gb-black',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.1%22-display-256gb-black',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.1%22-display-512gb-black',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.7%22-display-128gb-black',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.7%22-display-256gb-black',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.7%22-display-512gb-black',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.1%22-display-128gb-blue',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.1%22-display-256gb-blue',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.1%22-display-512gb-blue',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.7%22-display-128gb-blue',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.7%22-display-256gb-blue',
-    'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.7%22-display-512gb-blue',
+    'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro',
+    'https://www.apple.com/in/shop/buy-iphone/iphone-16',
+    'https://www.apple.com/in/shop/buy-iphone/iphone-15',
 ]
+# The per-configuration pages the list above replaced, scraped with the tile and price parsers for a
+# family whose buy page embeds no product data, so a change to that data can't drop whole families.
+# Mac families not listed here are their own fallback: their buy page's tiles are parsed instead.
+FALLBACK_URLS = {
+    'https://www.apple.com/in/shop/buy-mac/macbook-air/13-inch': [
+        'https://www.apple.com/in/shop/buy-mac/macbook-air/13-inch',
+        'https://www.apple.com/in/shop/buy-mac/macbook-air/15-inch',
+    ],
+    'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro': [
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.3%22-display-128gb-black-titanium',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.3%22-display-256gb-black-titanium',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.3%22-display-512gb-black-titanium',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.3%22-display-1tb-black-titanium',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.9%22-display-256gb-black-titanium',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.9%22-display-512gb-black-titanium',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16-pro/6.9%22-display-1tb-black-titanium',
+    ],
+    'https://www.apple.com/in/shop/buy-iphone/iphone-16': [
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.1%22-display-128gb-black',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.1%22-display-256gb-black',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.1%22-display-512gb-black',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.7%22-display-128gb-black',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.7%22-display-256gb-black',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-16/6.7%22-display-512gb-black',
+    ],
+    'https://www.apple.com/in/shop/buy-iphone/iphone-15': [
+        'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.1%22-display-128gb-blue',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.1%22-display-256gb-blue',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.1%22-display-512gb-blue',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.7%22-display-128gb-blue',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.7%22-display-256gb-blue',
+        'https://www.apple.com/in/shop/buy-iphone/iphone-15/6.7%22-display-512gb-blue',
+    ],
+}
 
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
 }
 OUTPUT_FILE = 'apple_products.json'
+PARSER_MODE = 'stream' # 'stream': single-pass extractor (page_extractor.py); 'soup': full BeautifulSoup tree
 
 def get_product_details_from_url(url):
     path_parts = [part for part in url.split('/') if part]
@@ -75,133 +111,148 @@ def get_product_details_from_url(url):
 
 PROCESSED_URLS = [get_product_details_from_url(url) for url in USER_PROVIDED_URLS]
 
-def get_soup(url):
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=20)
-        response.raise_for_status()
-        return BeautifulSoup(response.content, 'lxml')
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching {url}: {e}")
-        return None
-
-def extract_price_from_text(text):
-    if not text: return None
-    match = re.search(r'₹\s*([\d,]+(?:\.\d{2})?)', text)
-    if match:
-        price_str = match.group(1).replace(',', '')
-        try: return float(price_str)
-        except ValueError: return None
-    return None
-
-def parse_mac_specs(spec_string, product_base_name=""):
-    specs = {"chip": "N/A", "cpu_cores": 0, "gpu_cores": 0, "ram_gb": 0, "storage_tb": 0, "screen_size_inch": 0}
-    if not spec_string: spec_string = ""
-    chip_match = re.search(r'(Apple\sM\d\s?(?:Pro|Max|Ultra|Extreme)?\s?chip)', spec_string, re.IGNORECASE)
-    if chip_match: specs["chip"] = chip_match.group(1).strip()
-    else:
-        chip_match_simple = re.search(r'(M\d\s?(?:Pro|Max|Ultra|Extreme)?)', spec_string, re.IGNORECASE)
-        if chip_match_simple: specs["chip"] = f"Apple {chip_match_simple.group(1).strip()} chip"
-    cpu_match = re.search(r'(\d+)-core\sCPU', spec_string, re.IGNORECASE)
-    if cpu_match: specs["cpu_cores"] = int(cpu_match.group(1))
-    gpu_match = re.search(r'(\d+)-core\sGPU', spec_string, re.IGNORECASE)
-    if gpu_match: specs["gpu_cores"] = int(gpu_match.group(1))
-    ram_match = re.search(r'(\d+)GB\s(?:unified\s)?memory', spec_string, re.IGNORECASE)
-    if not ram_match: ram_match = re.search(r'(\d+)GB\sRAM', spec_string, re.IGNORECASE)
-    if ram_match: specs["ram_gb"] = int(ram_match.group(1).replace('GB', ''))
-    storage_match_gb = re.search(r'(\d+)GB\sSSD', spec_string, re.IGNORECASE)
-    storage_match_tb = re.search(r'(\d+)TB\sSSD', spec_string, re.IGNORECASE)
-    if storage_match_tb: specs["storage_tb"] = int(storage_match_tb.group(1))
-    elif storage_match_gb: specs["storage_tb"] = int(storage_match_gb.group(1)) / 1000
-    screen_size_text = product_base_name + " " + spec_string
-    screen_match = re.search(r'(\d{2})-inch', screen_size_text, re.IGNORECASE)
-    if screen_match: specs["screen_size_inch"] = int(screen_match.group(1))
-    else:
-        for size in ["13", "14", "15", "16", "24", "27"]:
-            if f"{size} inch" in screen_size_text.lower() or f"{size}-inch" in product_base_name.lower():
-                specs["screen_size_inch"] = int(size)
-                break
-    return specs
-
-def parse_iphone_specs_from_name(name_from_url):
-    specs = {"chip": "N/A", "storage_tb": 0, "screen_size_inch": 0.0, "cpu_cores": 0, "gpu_cores": 0, "ram_gb": 0}
-    screen_match = re.search(r'(\d+\.?\d*)\s*(?:inch|")', name_from_url, re.IGNORECASE)
-    if screen_match: specs["screen_size_inch"] = float(screen_match.group(1))
-    storage_match_gb = re.search(r'(\d+)GB', name_from_url, re.IGNORECASE)
-    storage_match_tb = re.search(r'(\d+)TB', name_from_url, re.IGNORECASE)
-    if storage_match_tb: specs["storage_tb"] = int(storage_match_tb.group(1))
-    elif storage_match_gb: specs["storage_tb"] = int(storage_match_gb.group(1)) / 1000
-    if "iPhone SE" in name_from_url: specs["chip"] = "A-series Bionic (SE)"
-    elif "Pro" in name_from_url or "Max" in name_from_url: specs["chip"] = "A-series Bionic Pro/Max (latest)"
-    elif re.search(r'iPhone\s\d+', name_from_url): specs["chip"] = "A-series Bionic (latest)"
-    return specs
-
-def scrape_mac_page(product_base_name, url, category):
+def region_targets(region):
+    # The same pages on another storefront; the default region is PROCESSED_URLS itself
+    if region.code == DEFAULT_REGION: return PROCESSED_URLS
+    return [get_product_details_from_url(region.url(url)) for url in USER_PROVIDED_URLS]
+
+_fetch_engine = None
+_region_engines = {}
+_fetch_engine_lock = threading.Lock()
+
+PARSE_SECONDS = metrics.histogram('scraper_parse_duration_seconds', 'Time to parse one page into its extracted strings', ('parser',))
+PAGE_SECONDS = metrics.histogram('scraper_page_duration_seconds', 'Time to scrape one page after it was fetched', ('region', 'url'),
+                                 metrics.SCRAPE_BUCKETS)
+RUN_SECONDS = metrics.histogram('scraper_run_duration_seconds', 'Time for a whole scraper run', ('region',), metrics.SCRAPE_BUCKETS + (300.0, 900.0))
+RUN_PRODUCTS = metrics.gauge('scraper_last_run_products', 'Products written by the last completed run', ('region',))
+PRICE_CHANGES = metrics.counter('scraper_price_changes_total', 'Prices recorded in the price history (new products included)', ('region',))
+
+def get_fetch_engine(region=None):
+    # One engine per region, as region scrapes can run at the same time: they share the session and
+    # the rate limit, but each keeps its own cache index and stats so runs don't reset or overwrite
+    # each other's
+    global _fetch_engine
+    region = region or get_region(DEFAULT_REGION)
+    with _fetch_engine_lock:
+        if _fetch_engine is None:
+            _fetch_engine = FetchEngine(headers=HEADERS)
+        if region.code not in _region_engines:
+            _region_engines[region.code] = _fetch_engine.with_cache(HttpCache(index_file=region.file_name(INDEX_FILE)))
+        return _region_engines[region.code]
+
+def get_soup(url, content=None):
+    # `content` is the already-fetched page body (see run_scraper_and_get_data); otherwise fetch it now
+    if content is None:
+        result = get_fetch_engine().fetch(url)
+        if result.error:
+            print(f"Error fetching {url}: {result.error}")
+            return None
+        content = result.content
+    return BeautifulSoup(content, 'lxml')
+
+def mac_page_from_soup(soup, price_pattern=PRICE_PATTERN):
+    # Same shape as page_extractor.extract_mac_page, built from a full BeautifulSoup tree
+    page_title = soup.select_one('head > title')
+    price_element = soup.select_one(MAC_PAGE_PRICE_SELECTOR)
+    price_string = soup.find(string=price_pattern)
+    items = []
+    for item_container in soup.select(MAC_CONTAINER_SELECTOR):
+        title_element = item_container.select_one(MAC_ITEM_TITLE_SELECTOR)
+        item_price_element = item_container.select_one(MAC_ITEM_PRICE_SELECTOR)
+        specs_text_element = item_container.select_one(MAC_ITEM_SPECS_SELECTOR)
+        item_price_string = item_container.find(string=price_pattern)
+        items.append({
+            "title": title_element.get_text(separator=' ', strip=True) if title_element else None,
+            "price_text": item_price_element.get_text(strip=True) if item_price_element else None,
+            "price_string": str(item_price_string) if item_price_string else None,
+            "specs": specs_text_element.get_text(separator=' ', strip=True) if specs_text_element else None,
+        })
+    return {
+        "title": page_title.get_text(strip=True) if page_title else None,
+        "price_text": price_element.get_text(strip=True) if price_element else None,
+        "price_string": str(price_string) if price_string else None,
+        "text": soup.get_text() if not items else None,
+        "items": items,
+    }
+
+def iphone_page_from_soup(soup, price_pattern=PRICE_PATTERN):
+    price_text = None
+    for selector in IPHONE_PRICE_SELECTORS:
+        price_element = soup.select_one(selector)
+        if price_element:
+            price_text = price_element.get_text(strip=True)
+            break
+    price_string = soup.find(string=price_pattern)
+    return {"price_text": price_text, "price_string": str(price_string) if price_string else None}
+
+def load_page(url, content, streaming_extract, soup_extract, price_pattern=PRICE_PATTERN):
+    # Returns the page's extracted strings, using the streaming extractor or a full soup per PARSER_MODE
+    if content is None:
+        result = get_fetch_engine().fetch(url)
+        if result.error:
+            print(f"Error fetching {url}: {result.error}")
+            return None
+        content = result.content
+    with PARSE_SECONDS.time(PARSER_MODE):
+        if PARSER_MODE == 'stream':
+            return streaming_extract(content, price_pattern)
+        return soup_extract(get_soup(url, content), price_pattern)
+
+def scrape_mac_page(product_base_name, url, category, content=None, region=None):
+    # Prices are parsed with the region's currency format and stored under its price field (price_inr, price_usd, ...)
+    region = region or get_region(DEFAULT_REGION)
     print(f"Scraping Mac page: {product_base_name} from {url}")
-    soup = get_soup(url)
-    if not soup: return []
+    page = load_page(url, content, extract_mac_page, mac_page_from_soup, region.price_pattern)
+    if not page: return []
     products = []
-    product_containers = soup.select('div.rc-productbundle-item, div.as-producttile, div.rf-producttile, .rf-bundle-selection-item')
-    if not product_containers:
+    if not page["items"]:
         print(f"  No Mac product containers found on {url} using primary selectors. Trying broader search or page might be dynamic / single item.")
-        page_title = soup.select_one('head > title')
-        page_title_text = page_title.get_text(strip=True) if page_title else product_base_name
-        price_element = soup.select_one('.rc-prices-fullprice, .currentprice .price-value, .as-price-currentprice .price-value, span[data-autom="price"]')
-        price_text = price_element.get_text(strip=True) if price_element else None
+        page_title_text = page["title"] if page["title"] is not None else product_base_name
+        price_text = page["price_text"]
         if not price_text:
-            price_match_page = soup.find(string=re.compile(r'₹\s*([\d,]+(?:\.\d{2})?)'))
-            if price_match_page: price_text = price_match_page.strip()
-        price = extract_price_from_text(price_text)
+            if page["price_string"]: price_text = page["price_string"].strip()
+        price = extract_price_from_text(price_text, region)
         if price:
             print(f"  Found a single price on Mac page: {price}. Assuming it's for {page_title_text}")
-            specs = parse_mac_specs(soup.get_text(), page_title_text)
-            product_data = {"name": page_title_text, "category": category, "base_model_name": product_base_name, "price_inr": price, **specs, "url": url, "scraped_at": datetime.now().isoformat()}
+            specs = parse_mac_specs(page["text"], page_title_text)
+            product_data = {"name": page_title_text, "category": category, "base_model_name": product_base_name, region.price_field: price, **specs, "url": url, "scraped_at": datetime.now().isoformat()}
             products.append(product_data)
-            print(f"    Successfully scraped single Mac: {product_data['name']} - Price: {product_data['price_inr']}")
+            print(f"    Successfully scraped single Mac: {product_data['name']} - Price: {product_data[region.price_field]}")
         else:
             print(f"  No product containers or single price found for Mac: {product_base_name} on {url}")
         return products
-    print(f"  Found {len(product_containers)} potential Mac product containers on {url}.")
-    for i, item_container in enumerate(product_containers):
+    print(f"  Found {len(page['items'])} potential Mac product containers on {url}.")
+    for i, item in enumerate(page["items"]):
         try:
-            title_element = item_container.select_one('.rc-productbundle-title, .as-producttile-title, .rf-producttile-title, .rf-bundle-header-title')
-            full_description = title_element.get_text(separator=' ', strip=True) if title_element else product_base_name
-            price_element = item_container.select_one('.rc-productbundle-price .price-value, .as-producttile-pricecurrent .price-value, .rf-producttile-pricecurrent .price-value, .rf-bundle-price .price-value')
-            price_text = price_element.get_text(strip=True) if price_element else None
+            full_description = item["title"] if item["title"] is not None else product_base_name
+            price_text = item["price_text"]
             if not price_text:
-                price_match_in_item = item_container.find(string=re.compile(r'₹\s*([\d,]+(?:\.\d{2})?)'))
-                if price_match_in_item: price_text = price_match_in_item.strip()
-            price = extract_price_from_text(price_text)
+                if item["price_string"]: price_text = item["price_string"].strip()
+            price = extract_price_from_text(price_text, region)
             if not price: continue
-            specs_text_element = item_container.select_one('.rc-productbundle-configsummary, .as-producttile-specs, .rf-producttile-specs, .rf-bundle-summary')
-            specs_text_content = specs_text_element.get_text(separator=' ', strip=True) if specs_text_element else full_description
+            specs_text_content = item["specs"] if item["specs"] is not None else full_description
             specs = parse_mac_specs(specs_text_content, full_description)
             product_name = full_description
             if "Apple" not in product_name and "Mac" in category: product_name = f"{product_base_name} - {full_description}"
             if (specs["cpu_cores"] == 0 or specs["gpu_cores"] == 0) and "Mac" in category and specs["chip"] != "N/A":
                  print(f"    Warning for {product_name}: Missing CPU/GPU cores. CPU: {specs['cpu_cores']}, GPU: {specs['gpu_cores']}. From: '{specs_text_content[:100]}...'")
-            product_data = {"name": product_name.strip(), "category": category, "base_model_name": product_base_name, "price_inr": price, **specs, "url": url, "scraped_at": datetime.now().isoformat()}
+            product_data = {"name": product_name.strip(), "category": category, "base_model_name": product_base_name, region.price_field: price, **specs, "url": url, "scraped_at": datetime.now().isoformat()}
             products.append(product_data)
             print(f"    Successfully scraped Mac config: {product_name.strip()} - Price: {price} - CPU: {specs['cpu_cores']}, GPU: {specs['gpu_cores']}, RAM: {specs['ram_gb']}GB, Storage: {specs['storage_tb']}TB")
         except Exception as e:
             print(f"    Error processing a Mac item from {url} (Item {i+1}): {e}")
     return products
 
-def scrape_iphone_page(product_name_from_url, url, category):
+def scrape_iphone_page(product_name_from_url, url, category, content=None, region=None):
+    region = region or get_region(DEFAULT_REGION)
     print(f"Scraping iPhone (specific config): {product_name_from_url} from {url}")
-    soup = get_soup(url)
-    if not soup: return []
+    page = load_page(url, content, extract_iphone_page, iphone_page_from_soup, region.price_pattern)
+    if not page: return []
     products = []
-    price_text = None
-    price_selectors = ['div[data-autom="price"] span.price-value', 'span[data-autom="price"]', '.rc-prices-fullprice .price-value', '.as-price-currentprice .price-value', '.rf-pdp-price .price-value', '.hero-price .price-value', 'span.currentprice']
-    for selector in price_selectors:
-        price_element = soup.select_one(selector)
-        if price_element:
-            price_text = price_element.get_text(strip=True)
-            break
+    price_text = page["price_text"]
     if not price_text:
-        price_match_page = soup.find(string=re.compile(r'₹\s*([\d,]+(?:\.\d{2})?)'))
-        if price_match_page: price_text = price_match_page.strip()
-    price = extract_price_from_text(price_text)
+        if page["price_string"]: price_text = page["price_string"].strip()
+    price = extract_price_from_text(price_text, region)
     if price:
         specs = parse_iphone_specs_from_name(product_name_from_url)
         base_model_name_match = re.match(r'(IPHONE\s\d+\s?(?:PRO|MAX|PLUS|SE)?)', product_name_from_url, re.I)
@@ -209,7 +260,7 @@ def scrape_iphone_page(product_name_from_url, url, category):
 
         product_data = {
             "name": product_name_from_url, "category": category, "base_model_name": base_model_name,
-            "price_inr": price, **specs, "url": url, "scraped_at": datetime.now().isoformat()
+            region.price_field: price, **specs, "url": url, "scraped_at": datetime.now().isoformat()
         }
         products.append(product_data)
         print(f"  Successfully scraped iPhone: {product_name_from_url} - Price: {price}, Storage: {specs['storage_tb']}TB, Screen: {specs['screen_size_inch']}\"")
@@ -217,33 +268,226 @@ def scrape_iphone_page(product_name_from_url, url, category):
         print(f"  Could not find price for iPhone: {product_name_from_url} on {url}. Price text found: '{price_text}'")
     return products
 
-def run_scraper_and_get_data(): # Renamed main to this
-    all_products = []
-    for item_details in PROCESSED_URLS:
+def fetch_sku_titles(part_numbers, region):
+    # Detail fetch for new SKUs the embedded data doesn't fully describe: each one's product page title
+    titles = {}
+    urls = [detail_url(part_number, region) for part_number in part_numbers]
+    print(f"  Fetching details for {len(urls)} new SKU(s)")
+    for part_number, result in zip(part_numbers, get_fetch_engine(region).fetch_all(urls)):
+        if result.error:
+            print(f"  Could not fetch details for {part_number}: {result.error}")
+            continue
+        titles[part_number] = extract_mac_page(result.content, region.price_pattern)["title"] or ''
+    return titles
+
+def fallback_urls(url, region):
+    # FALLBACK_URLS for the family page at `url` on this storefront, or []
+    for family_url, urls in FALLBACK_URLS.items():
+        if region.url(family_url) == url:
+            return [region.url(fallback_url) for fallback_url in urls]
+    return []
+
+def scrape_configuration_pages(urls, content_by_url, region):
+    # Products from per-configuration pages, fetched unless their body is already in content_by_url
+    missing = [url for url in urls if url not in content_by_url]
+    for url, result in zip(missing, get_fetch_engine(region).fetch_all(missing)):
+        if result.error:
+            print(f"  Could not fetch {url}: {result.error}")
+            continue
+        content_by_url[url] = result.content
+    products = []
+    for url in urls:
+        if url in content_by_url:
+            products.extend(scrape_page(get_product_details_from_url(url), content_by_url[url], region, fallback=False))
+    return products
+
+def scrape_page(item_details, content, region=None, registry=None, fallback=True):
+    # Every configuration embedded in the page when it has any (discovery.py). Otherwise the family's
+    # per-configuration pages (FALLBACK_URLS) if it has them, else the rendered tiles or single price
+    # as before. Only with a registry are SKUs remembered between runs and new ones fetched for details.
+    region = region or get_region(DEFAULT_REGION)
+    name, url, category_type = item_details["name"], item_details["url"], item_details["category"]
+    configs = extract_configurations(content, region.currency)
+    if configs:
+        print(f"  Found {len(configs)} SKU(s) in the page's embedded product data.")
+        fetch_details = (lambda part_numbers: fetch_sku_titles(part_numbers, region)) if registry is not None else None
+        return discover_products(configs, category_type, url, region,
+                                 registry if registry is not None else SkuRegistry(None), fetch_details)
+    urls = fallback_urls(url, region) if fallback else []
+    if urls:
+        print(f"  No embedded product data; scraping {len(urls)} per-configuration page(s) instead.")
+        return scrape_configuration_pages(urls, {url: content}, region)
+    if "Mac" in category_type:
+        return scrape_mac_page(name, url, category_type, content, region)
+    if "iPhone" in category_type:
+        return scrape_iphone_page(name, url, category_type, content, region)
+    print(f"Warning: No specific scraper defined for category type '{category_type}'. Skipping {name}.")
+    return []
+
+def iter_pages(targets, concurrent=True, region=None):
+    # Yields (target, FetchResult or None) in target order as pages arrive, over the shared pooled
+    # session; each body can be dropped as soon as its page has been parsed
+    started = datetime.now()
+    engine = get_fetch_engine(region)
+    urls = [item["url"] for item in targets]
+    results = engine.iter_fetch(urls) if concurrent else (engine.fetch(url) for url in urls)
+    fetched = 0
+    for item, result in zip(targets, results):
+        if result.error:
+            print(f"Error fetching {result.url}: {result.error} (after {result.attempts} attempt(s))")
+            result = None
+        else:
+            fetched += 1
+        yield item, result
+    print(f"\nFetched {fetched}/{len(urls)} pages {'concurrently' if concurrent else 'serially'} in {(datetime.now() - started).total_seconds():.2f}s")
+
+def load_previous_products(output_file=OUTPUT_FILE):
+    # Products from the last successful run, grouped by page on disk (pipeline.PageStore) and sorted
+    # for diff_catalogue_streams within each page
+    try:
+        return pipeline.PageStore(pipeline.iter_json_array(output_file), incremental_state.key_order)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Could not read the last run's products from {output_file}: {e}. Treating every page as new.")
+    return pipeline.PageStore([])
+
+def drop_seen_skus(products, seen_parts):
+    # Family pages can embed each other's configurations (both sizes of a MacBook Pro, say); a
+    # product is kept only by the first page that listed any of its part numbers, so a colour variant
+    # grouped differently on a later page is dropped rather than listed twice
+    kept = [product for product in products if seen_parts.isdisjoint(product.get("part_numbers") or ())]
+    for product in kept:
+        seen_parts.update(product.get("part_numbers") or ())
+    return kept
+
+def scrape_pages(pages, region, previous_by_url, previous_state, registry=None):
+    # Yields (target, products, fingerprint, parse_skipped) for every fetched page, in order.
+    # Pages that failed to fetch yield products=None; the caller decides what to keep for them.
+    for item_details, page in pages:
         name = item_details["name"]
         url = item_details["url"]
         category_type = item_details["category"]
         print(f"\n--- Scraping: {name} ({category_type}) ---")
         print(f"URL: {url}")
+        if page is None:
+            yield item_details, None, None, False
+            continue
+        started = time.perf_counter()
         scraped_data = []
-        if "Mac" in category_type:
-            scraped_data = scrape_mac_page(name, url, category_type)
-        elif "iPhone" in category_type:
-            scraped_data = scrape_iphone_page(name, url, category_type)
-        else:
-            print(f"Warning: No specific scraper defined for category type '{category_type}'. Skipping {name}.")
-        if scraped_data:
-            all_products.extend(scraped_data)
-        else:
+        fingerprint = incremental_state.page_fingerprint(page.content)
+        previous = previous_by_url.get(url)
+        # A 304 alone is not enough: the HTTP cache takes a new body as soon as it is fetched, even if
+        # the run then fails before the page is journaled. scrape_state.json is only saved after a
+        # successful run, so a matching fingerprint means these products came from this very body.
+        if previous and previous_state.get(url) == fingerprint:
+            # Same content as the page we parsed last time (including a 304 served from the cache)
+            scraped_data = previous
+            print(f"  Page unchanged since last scrape; reusing {len(scraped_data)} product(s) without parsing.")
+            PAGE_SECONDS.observe(page.elapsed + time.perf_counter() - started, region.code, url)
+            yield item_details, scraped_data, fingerprint, True
+            continue
+        scraped_data = scrape_page(item_details, page.content, region, registry)
+        if not scraped_data:
             print(f"  No data scraped for {name} from {url}.")
-    if all_products:
-        all_products.sort(key=lambda x: (x['category'], x.get('price_inr', float('inf'))))
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(all_products, f, indent=4, ensure_ascii=False)
-        print(f"\nSuccessfully scraped {len(all_products)} products and saved to {OUTPUT_FILE}")
+        # Fetch time (retries included) plus everything done with the body
+        PAGE_SECONDS.observe(page.elapsed + time.perf_counter() - started, region.code, url)
+        yield item_details, scraped_data, fingerprint if scraped_data else None, False
+
+def run_scraper_and_get_data(concurrent=True, incremental=True, region=DEFAULT_REGION, resume=True): # Renamed main to this
+    # incremental: pages whose content fingerprint matches the last run reuse that run's products
+    # instead of being parsed again, and pages that fail to fetch keep their previous products.
+    # region: storefront code from regions.py; each region has its own output, state and change files.
+    # Products stream page by page into an NDJSON journal; a run that dies part-way is resumed from
+    # its last completed page (resume=False starts over). The sorted catalogue is then produced by an
+    # external merge of the journal, so neither page bodies nor the unsorted catalogue stay in memory.
+    started = time.perf_counter()
+    region = get_region(region)
+    targets = region_targets(region)
+    output_file, columnar_file = region.file_name(OUTPUT_FILE), region.file_name(COLUMNAR_FILE)
+    state_file, changes_file = region.file_name(incremental_state.STATE_FILE), region.file_name(incremental_state.CHANGES_FILE)
+    journal_file = region.file_name(pipeline.JOURNAL_FILE)
+    engine = get_fetch_engine(region)
+    if engine.cache: engine.cache.reset_stats()
+    previous_products = load_previous_products(output_file)
+    previous_by_url = previous_products if incremental else {}
+    previous_state = incremental_state.load_state(state_file) if incremental else {}
+    completed, resume_from = pipeline.load_journal(journal_file) if resume else ({}, None)
+    if completed:
+        print(f"Resuming interrupted run: {len(completed)}/{len(targets)} page(s) already in {journal_file}")
+    remaining = [item for item in targets if item["url"] not in completed]
+    registry = SkuRegistry(region.file_name(SKU_FILE))
+    seen_parts = {part for product in pipeline.iter_journal_products(journal_file) for part in product.get("part_numbers") or ()} if completed else set()
+    parses_skipped = 0
+    failed = []
+    with pipeline.NdjsonJournal(journal_file, resume_from) as journal:
+        for item_details, scraped_data, fingerprint, skipped in scrape_pages(iter_pages(remaining, concurrent, region), region, previous_by_url, previous_state, registry):
+            if scraped_data is None:
+                failed.append(item_details)  # Not journaled yet, so a resumed run tries the page again
+                continue
+            journal.write_page(item_details["url"], drop_seen_skus(scraped_data, seen_parts), fingerprint)
+            parses_skipped += skipped
+        for item_details in failed:
+            url = item_details["url"]
+            scraped_data = drop_seen_skus(previous_by_url.get(url, []), seen_parts)
+            print(f"  {url} could not be fetched.{f' Keeping {len(scraped_data)} product(s) from the last run.' if scraped_data else ''}")
+            journal.write_page(url, scraped_data, previous_state.get(url))
+    registry.save()
+
+    completed, _ = pipeline.load_journal(journal_file)
+    state = {url: fingerprint for url, fingerprint in completed.items() if fingerprint is not None}
+    # Same order as sorting the whole catalogue: category, price, then target order (stable within a page)
+    position = {item["url"]: i for i, item in enumerate(targets)}
+    sort_key = lambda x: (x['category'], x.get(region.price_field, float('inf')), position.get(x.get('url'), len(position)))
+    tmp_path = output_file + '.tmp'
+    product_count = pipeline.write_json_array(pipeline.external_sort(pipeline.iter_journal_products(journal_file), sort_key), tmp_path)
+    # Everything after this reads the sorted file back as a stream, so no step holds the whole
+    # catalogue: the diff merges both catalogues sorted by product key on disk, the columnar file
+    # is written in two passes over the JSON, and the history takes one pass
+    if product_count:
+        changes = incremental_state.diff_catalogue_streams(previous_products.records(), enumerate(pipeline.iter_json_array(tmp_path)),
+                                                           region.price_field, old_sorted=True)
+        print(f"\nChanges since last run: {incremental_state.summarize(changes)}")
+        if len(previous_products) and incremental_state.is_empty(changes) and len(previous_products) == product_count:
+            # Nothing moved: leave the file (and its mtime) alone so app workers don't reload for nothing
+            print(f"Catalogue unchanged; {output_file} left as is.")
+            os.remove(tmp_path)
+            if not is_current(columnar_file, output_file):
+                write_columnar(lambda: pipeline.iter_json_array(output_file), columnar_file, output_file)
+        else:
+            # Columnar file first: workers reload when the JSON file changes and then prefer the columnar
+            # one. Its header carries the temp file's size and mtime, which the rename keeps.
+            write_columnar(lambda: pipeline.iter_json_array(tmp_path), columnar_file, tmp_path)
+            # The JSON was streamed to a temp file; the rename means app workers never see it half-written
+            os.replace(tmp_path, output_file)
+            print(f"Successfully scraped {product_count} products and saved to {output_file} and {columnar_file}")
+        incremental_state.save_changes(changes, changes_file)
+        incremental_state.save_state(state, state_file)
+        # Every run goes into the history, unchanged or not, so last_seen stays current; only prices
+        # that moved add rows
+        try:
+            recorded = price_history.record_snapshot(pipeline.iter_json_array(output_file), region.price_field,
+                                                     region.file_name(price_history.HISTORY_FILE))
+            PRICE_CHANGES.inc(region.code, amount=recorded)
+            print(f"Price history: {recorded} price change(s) recorded.")
+        except sqlite3.Error as e:
+            print(f"Error writing price history: {e}. The catalogue was saved; this run's prices are missing from the history.")
     else:
+        os.remove(tmp_path)
         print("\nNo products were scraped. The output file was not updated.")
-    return all_products # Return the data
+    pipeline.remove_journal(journal_file)
+    if engine.cache:
+        engine.cache.save()
+        print(f"{engine.cache.report()}, {parses_skipped} page parse(s) skipped")
+    RUN_SECONDS.observe(time.perf_counter() - started, region.code)
+    previous_products.close()
+    RUN_PRODUCTS.set(product_count, region.code)
+    return product_count # Products written; 0 when the run scraped nothing
 
 if __name__ == "__main__":
-    run_scraper_and_get_data() # Call the renamed function if script is run directly
\ No newline at end of file
+    import sys
+    # --serial: fetch one page at a time; --full: re-parse every page instead of reusing unchanged ones;
+    # --region=us: scrape another storefront (see regions.py); --restart: ignore an interrupted run's journal
+    region = next((arg.split('=', 1)[1] for arg in sys.argv if arg.startswith('--region=')), DEFAULT_REGION)
+    run_scraper_and_get_data(concurrent='--serial' not in sys.argv, incremental='--full' not in sys.argv, region=region,
+                             resume='--restart' not in sys.argv) # Call the renamed function if script is run directly
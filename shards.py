@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from catalogue import Catalogue
+from catalogue_store import COLUMNAR_FILE, ColumnarCatalogue
+import metrics
+from price_history import HISTORY_FILE, PriceHistory
+from refresher import LOCK_FILE, BackgroundRefresher
+from regions import DEFAULT_REGION, get_region
+from scraper import OUTPUT_FILE, run_scraper_and_get_data
+
+# --- Configuration ---
+PRODUCTS_FILE = OUTPUT_FILE                 # Per-region files get a suffix, e.g. apple_products_us.json
+LAST_SCRAPED_FILE = 'last_scraped.txt'
+SCRAPE_INTERVAL_HOURS = 24                  # Scrape data if older than 24 hours
+SHARD_IDLE_MINUTES = 30                     # Regions nobody asked for in this long are dropped from memory
+SWEEP_SECONDS = 60                          # How often requests check for idle regions
+RETIRED_GRACE_SECONDS = 300                 # A replaced columnar file stays mapped this long for in-flight requests
+
+LOAD_SECONDS = metrics.histogram('catalogue_load_duration_seconds',
+                                 'Time to read a catalogue (source: columnar or json) and to build its indexes (source: index)',
+                                 ('region', 'source'))
+CATALOGUE_PRODUCTS = metrics.gauge('catalogue_products', 'Products in the catalogue being served', ('region',))
+
+
+class RegionShard:
+    # One region's catalogue plus its refresher. Loading, reloading and scraping work exactly like the
+    # single-catalogue app did, only with the region's own files.
+    def __init__(self, region, scrape_interval_hours=SCRAPE_INTERVAL_HOURS, on_reload=None, transient=False):
+        # transient: a one-off read of what is on disk (see ShardManager.peek); it publishes no gauge
+        self.region = region
+        self.transient = transient
+        self.products_file = region.file_name(PRODUCTS_FILE)
+        self.columnar_file = region.file_name(COLUMNAR_FILE)
+        self.last_scraped_file = region.file_name(LAST_SCRAPED_FILE)
+        self.history = PriceHistory(region.file_name(HISTORY_FILE), region.price_field)
+        self.on_reload = on_reload
+        self.catalogue = Catalogue([], price_field=region.price_field)
+        self.store = None      # The ColumnarCatalogue behind self.catalogue, if any
+        self.retired = []      # (retired at, store) for mapped files replaced by a reload
+        self.loaded_at = None
+        self.last_used = time.monotonic()
+        self.refresher = BackgroundRefresher(self.products_file, scrape_interval_hours, scrape=self.scrape,
+                                             reload=self.reload, get_last_scraped=self.get_last_scraped_time,
+                                             set_last_scraped=self.set_last_scraped_time,
+                                             lock_file=region.file_name(LOCK_FILE))
+
+    def get_last_scraped_time(self):
+        try:
+            with open(self.last_scraped_file, 'r') as f:
+                return datetime.fromisoformat(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def set_last_scraped_time(self):
+        tmp_path = self.last_scraped_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(datetime.now().isoformat())
+        os.replace(tmp_path, self.last_scraped_file)
+
+    def load_columnar_products(self):
+        # The memory-mapped file the scraper writes alongside the JSON export; only used while its
+        # header says it was built from the JSON file as it is now, so a hand-edited or restored JSON
+        # file still wins
+        if not os.path.exists(self.columnar_file):
+            return None
+        try:
+            products = ColumnarCatalogue(self.columnar_file)
+        except (OSError, ValueError) as e:
+            print(f"Error reading {self.columnar_file}: {e}. Falling back to {self.products_file}.")
+            return None
+        if not products.is_built_from(self.products_file):
+            products.close()
+            print(f"{self.columnar_file} was not built from the current {self.products_file}; reading the JSON instead.")
+            return None
+        print(f"Loaded {len(products)} products from {self.columnar_file}")
+        return products
+
+    def load_products(self):
+        # Reads the last good catalogue from disk. Scraping never happens here: the background refresher
+        # owns that, so startup (and every gunicorn worker) is ready without touching the network.
+        products = self.load_columnar_products()
+        if products is not None:
+            return products
+        if not os.path.exists(self.products_file):
+            print(f"{self.products_file} not found. Serving an empty catalogue until the background scrape finishes.")
+            return None
+        try:
+            with open(self.products_file, 'r', encoding='utf-8') as f:
+                products = json.load(f)
+                print(f"Loaded {len(products)} products from {self.products_file}")
+                return products
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading {self.products_file}: {e}. Keeping the current catalogue and requesting a re-scrape.")
+            return None
+
+    def catalogue_version(self):
+        # Same file on disk -> same version in every worker, so cached responses and ETags agree
+        try:
+            stat = os.stat(self.products_file)
+            return f"{self.region.code}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        except OSError:
+            return None
+
+    def reload(self):
+        # Builds the new indexes off to the side, then swaps the reference in one assignment, so
+        # in-flight requests keep the catalogue they started with and nobody sees a half-built one
+        version = self.catalogue_version()  # Taken before reading; a file replaced mid-load just triggers another reload
+        started = time.perf_counter()
+        products = self.load_products()
+        if products is None:
+            self.refresher.request_scrape()
+            return False
+        read_done = time.perf_counter()
+        LOAD_SECONDS.observe(read_done - started, self.region.code, 'columnar' if isinstance(products, ColumnarCatalogue) else 'json')
+        self.catalogue = Catalogue(products, version, self.region.price_field)
+        LOAD_SECONDS.observe(time.perf_counter() - read_done, self.region.code, 'index')
+        self.retire_store(products if isinstance(products, ColumnarCatalogue) else None)
+        if not self.transient:
+            CATALOGUE_PRODUCTS.set(len(self.catalogue), self.region.code)
+        self.loaded_at = datetime.now()
+        if self.on_reload:
+            self.on_reload(self)
+        return True
+
+    def retire_store(self, store):
+        # Requests that started before the swap may still read rows from the old mapped file, so it
+        # is unmapped after a grace period rather than at once
+        now = time.monotonic()
+        if self.store is not None and self.store is not store:
+            self.retired.append((now, self.store))
+        self.store = store
+        while self.retired and now - self.retired[0][0] >= RETIRED_GRACE_SECONDS:
+            self.retired.pop(0)[1].close()
+
+    def scrape(self):
+        # Runs on the refresher thread of whichever worker holds this region's refresh lock
+        return bool(run_scraper_and_get_data(region=self.region.code))
+
+    def status(self):
+        last_scraped = self.get_last_scraped_time()
+        return {
+            "products": len(self.catalogue),
+            "currency": self.region.currency,
+            "catalogue_version": self.catalogue.version,
+            "catalogue_loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "last_scraped": last_scraped.isoformat() if last_scraped else None,
+            "stale": self.refresher.is_stale(),
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+        }
+
+
+class ShardManager:
+    # Region catalogues load on their first request and are dropped after SHARD_IDLE_MINUTES without
+    # one, refresher included, so memory and scraping only cover the regions people actually use.
+    # The default region is pinned.
+    def __init__(self, scrape_interval_hours=SCRAPE_INTERVAL_HOURS, on_reload=None, start_refreshers=True,
+                 idle_minutes=SHARD_IDLE_MINUTES, pinned=(DEFAULT_REGION,)):
+        self.scrape_interval_hours = scrape_interval_hours
+        self.on_reload = on_reload
+        self.start_refreshers = start_refreshers
+        self.idle_seconds = idle_minutes * 60
+        self.pinned = set(pinned)
+        self.shards = {}
+        self.peeked = {}                # Region code -> transient shard kept for peek(), under the same idle eviction
+        self.lock = threading.Lock()    # Guards self.shards and self.peeked; never held while a catalogue loads
+        self.load_locks = {}            # Region code -> lock held while that region's first load runs
+        self.last_sweep = time.monotonic()
+
+    def get(self, code=None):
+        # Raises KeyError for an unknown region code
+        region = get_region(code)
+        shard = self.shards.get(region.code)
+        if shard is None:
+            # Only requests for the same region wait for its cold load; other regions keep being served
+            with self.lock:
+                load_lock = self.load_locks.setdefault(region.code, threading.Lock())
+            with load_lock:
+                shard = self.shards.get(region.code)
+                if shard is None:
+                    shard = RegionShard(region, self.scrape_interval_hours, self.on_reload)
+                    shard.reload()
+                    if self.start_refreshers:
+                        shard.refresher.start()
+                    with self.lock:
+                        self.shards[region.code] = shard
+                        self.peeked.pop(region.code, None)
+        return self.touch(shard)
+
+    def peek(self, code=None):
+        # A region for read-only use: its shard if loaded, otherwise a transient one read from disk that
+        # is never refreshed, so nothing gets scraped. The transient shard is kept and only read again
+        # once the file on disk changes. Raises KeyError for an unknown code.
+        region = get_region(code)
+        shard = self.shards.get(region.code)
+        if shard is None:
+            with self.lock:
+                shard = self.peeked.get(region.code)
+                load_lock = self.load_locks.setdefault(region.code, threading.Lock())
+            if shard is None or shard.catalogue_version() != shard.catalogue.version:
+                with load_lock:
+                    shard = self.peeked.get(region.code) or RegionShard(region, self.scrape_interval_hours, transient=True)
+                    if shard.catalogue_version() != shard.catalogue.version or shard.loaded_at is None:
+                        shard.reload()
+                    with self.lock:
+                        self.peeked[region.code] = shard
+        return self.touch(shard)
+
+    def touch(self, shard):
+        shard.last_used = time.monotonic()
+        if shard.last_used - self.last_sweep >= SWEEP_SECONDS:
+            self.evict_idle()
+        return shard
+
+    def loaded(self):
+        with self.lock:
+            return dict(self.shards)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        self.last_sweep = now
+        with self.lock:
+            idle = [code for code, shard in self.shards.items()
+                    if code not in self.pinned and now - shard.last_used >= self.idle_seconds]
+            for code in idle:
+                self.shards.pop(code).refresher.stop()
+                CATALOGUE_PRODUCTS.remove(code)
+            for code in [code for code, shard in self.peeked.items() if now - shard.last_used >= self.idle_seconds]:
+                del self.peeked[code]
+        for code in idle:
+            print(f"Dropped idle region '{code}' from memory")
+        return idle
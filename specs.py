@@ -0,0 +1,101 @@
+import re
+from functools import lru_cache
+
+# Spec strings repeat heavily across colour variants and tiles, so parses are memoized
+SPEC_CACHE_SIZE = 4096
+
+PRICE_PATTERN = re.compile(r'₹\s*([\d,]+(?:\.\d{2})?)')
+
+# One scan over "<base name> <spec string>" finds every Mac spec. Each alternative sits inside a
+# zero-width lookahead so no match consumes characters another kind might start on; that keeps
+# "first match of each kind" identical to running the patterns one by one with re.search. The
+# leading character class lets the engine skip positions where no spec can start.
+MAC_SPEC_PATTERN = re.compile(r'''(?=[\dAM])(?=
+      (?P<chip>Apple\sM\d\s?(?:Pro|Max|Ultra|Extreme)?\s?chip)
+    | (?P<chip_short>M\d\s?(?:Pro|Max|Ultra|Extreme)?)
+    | (?P<cpu>\d+)-core\sCPU
+    | (?P<gpu>\d+)-core\sGPU
+    | (?P<ram_memory>\d+)GB\s(?:unified\s)?memory
+    | (?P<ram>\d+)GB\sRAM
+    | (?P<ssd_gb>\d+)GB\sSSD
+    | (?P<ssd_tb>\d+)TB\sSSD
+    | (?P<screen>\d{2})-inch
+)''', re.IGNORECASE | re.VERBOSE)
+# Once these are found, later matches cannot change the result (they win over chip_short, ram and ssd_gb)
+MAC_SPEC_DECISIVE_KINDS = frozenset(('chip', 'cpu', 'gpu', 'ram_memory', 'ssd_tb', 'screen'))
+SCREEN_SIZE_WORDS_PATTERN = re.compile(r'(13|14|15|16|24|27) inch')
+SCREEN_SIZE_FALLBACK_ORDER = ("13", "14", "15", "16", "24", "27")
+
+IPHONE_SCREEN_PATTERN = re.compile(r'(\d+\.?\d*)\s*(?:inch|")', re.IGNORECASE)
+IPHONE_STORAGE_GB_PATTERN = re.compile(r'(\d+)GB', re.IGNORECASE)
+IPHONE_STORAGE_TB_PATTERN = re.compile(r'(\d+)TB', re.IGNORECASE)
+IPHONE_MODEL_PATTERN = re.compile(r'iPhone\s\d+')
+
+
+def extract_price_from_text(text, region=None):
+    # region (see regions.py) supplies the currency pattern and separators; rupees by default
+    if not text: return None
+    match = (region.price_pattern if region else PRICE_PATTERN).search(text)
+    if match:
+        price_str = match.group(1).replace(region.group_separator if region else ',', '')
+        if region and region.decimal_separator != '.': price_str = price_str.replace(region.decimal_separator, '.')
+        try: return float(price_str)
+        except ValueError: return None
+    return None
+
+
+@lru_cache(maxsize=SPEC_CACHE_SIZE)
+def _mac_specs(spec_string, product_base_name):
+    found = {}
+    # Only the screen size may come from the base name; every other spec is read from spec_string
+    spec_start = len(product_base_name) + 1
+    for match in MAC_SPEC_PATTERN.finditer(product_base_name + " " + spec_string):
+        kind = match.lastgroup
+        if kind in found or (kind != 'screen' and match.start() < spec_start):
+            continue
+        found[kind] = match.group(kind)
+        if MAC_SPEC_DECISIVE_KINDS <= found.keys(): break
+
+    specs = {"chip": "N/A", "cpu_cores": 0, "gpu_cores": 0, "ram_gb": 0, "storage_tb": 0, "screen_size_inch": 0}
+    if 'chip' in found: specs["chip"] = found['chip'].strip()
+    elif 'chip_short' in found: specs["chip"] = f"Apple {found['chip_short'].strip()} chip"
+    if 'cpu' in found: specs["cpu_cores"] = int(found['cpu'])
+    if 'gpu' in found: specs["gpu_cores"] = int(found['gpu'])
+    ram = found.get('ram_memory') or found.get('ram')
+    if ram: specs["ram_gb"] = int(ram)
+    if 'ssd_tb' in found: specs["storage_tb"] = int(found['ssd_tb'])
+    elif 'ssd_gb' in found: specs["storage_tb"] = int(found['ssd_gb']) / 1000
+    if 'screen' in found: specs["screen_size_inch"] = int(found['screen'])
+    else:
+        screen_size_text = product_base_name + " " + spec_string
+        sizes_in_text = set(SCREEN_SIZE_WORDS_PATTERN.findall(screen_size_text.lower()))
+        base_name_lower = product_base_name.lower()
+        for size in SCREEN_SIZE_FALLBACK_ORDER:
+            if size in sizes_in_text or f"{size}-inch" in base_name_lower:
+                specs["screen_size_inch"] = int(size)
+                break
+    return tuple(specs.items())
+
+
+def parse_mac_specs(spec_string, product_base_name=""):
+    return dict(_mac_specs(spec_string or "", product_base_name))
+
+
+@lru_cache(maxsize=SPEC_CACHE_SIZE)
+def _iphone_specs(name_from_url):
+    specs = {"chip": "N/A", "storage_tb": 0, "screen_size_inch": 0.0, "cpu_cores": 0, "gpu_cores": 0, "ram_gb": 0}
+    screen_match = IPHONE_SCREEN_PATTERN.search(name_from_url)
+    if screen_match: specs["screen_size_inch"] = float(screen_match.group(1))
+    storage_match_tb = IPHONE_STORAGE_TB_PATTERN.search(name_from_url)
+    if storage_match_tb: specs["storage_tb"] = int(storage_match_tb.group(1))
+    else:
+        storage_match_gb = IPHONE_STORAGE_GB_PATTERN.search(name_from_url)
+        if storage_match_gb: specs["storage_tb"] = int(storage_match_gb.group(1)) / 1000
+    if "iPhone SE" in name_from_url: specs["chip"] = "A-series Bionic (SE)"
+    elif "Pro" in name_from_url or "Max" in name_from_url: specs["chip"] = "A-series Bionic Pro/Max (latest)"
+    elif IPHONE_MODEL_PATTERN.search(name_from_url): specs["chip"] = "A-series Bionic (latest)"
+    return tuple(specs.items())
+
+
+def parse_iphone_specs_from_name(name_from_url):
+    return dict(_iphone_specs(name_from_url))